@@ -0,0 +1,72 @@
+import math
+import statistics
+from collections import deque
+from typing import List
+
+
+class GameClock:
+    """
+    Fixed rate tick scheduler on the monotonic clock of a screen.
+
+    `wait` returns when the next tick is due, with all keys pressed since
+    the previous one, so key presses never shorten a tick. Ticks are
+    scheduled from the previous due time rather than from the moment
+    the previous tick was handled, so handling time does not add up.
+    """
+
+    def __init__(self, screen, interval: float, history: int = 256):
+        self.screen = screen
+        self.interval = interval
+        # Real intervals between ticks, in seconds
+        self.frame_times: deque = deque(maxlen=history)
+        self.late_ticks = 0
+        self.reset()
+
+    def reset(self):
+        """Start the schedule anew, e.g. after a pause."""
+        self.last_tick = self.screen.monotonic()
+        self.next_tick = self.last_tick + self.interval
+
+    def wait(self) -> List[int]:
+        keys = []
+        while True:
+            remaining = self.next_tick - self.screen.monotonic()
+            if remaining <= 0:
+                break
+            self.screen.timeout(max(1, math.ceil(remaining * 1000)))
+            key = self.screen.getch()
+            if key != -1:
+                keys.append(key)
+
+        now = self.screen.monotonic()
+        self.frame_times.append(now - self.last_tick)
+        self.last_tick = now
+        self.next_tick += self.interval
+        if self.next_tick <= now:
+            # More than a whole tick behind: skip it instead of rushing
+            # through the missed ones.
+            self.late_ticks += 1
+            self.next_tick = now + self.interval
+        return keys
+
+    @property
+    def mean_frame_time(self) -> float:
+        if not self.frame_times:
+            return 0.0
+        return statistics.fmean(self.frame_times)
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the real tick length."""
+        if len(self.frame_times) < 2:
+            return 0.0
+        return statistics.pstdev(self.frame_times)
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'mean_frame_time': self.mean_frame_time,
+            'max_frame_time': max(self.frame_times, default=0.0),
+            'jitter': self.jitter,
+            'late_ticks': self.late_ticks,
+        }
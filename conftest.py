@@ -0,0 +1,2 @@
+# Its directory, the root of the repository, is put on sys.path by pytest,
+# so that tests import the games as `python main.py` does.
@@ -0,0 +1,87 @@
+import importlib
+import time
+from typing import Dict, List, Optional
+
+# Third-party games register themselves with an entry point in this group,
+# e.g. in setup.cfg:
+#     [options.entry_points]
+#     console_games.games =
+#         Tetris = tetris.gui:TetrisMain
+ENTRY_POINT_GROUP = 'console_games.games'
+
+
+class GameEntry:
+    """
+    Game shown in the main menu, imported and created on first use.
+
+    `target` is `'module:ClassName'`, the class is called with the screen
+    and must provide `main_menu` with a `display()` method.
+    """
+
+    def __init__(self, label: str, target: str):
+        self.label = label
+        self.target = target
+        self.game = None
+        self.import_seconds: Optional[float] = None
+        self.init_seconds: Optional[float] = None
+
+    def load(self, window):
+        if self.game is None:
+            module_name, class_name = self.target.split(':')
+            started = time.perf_counter()
+            module = importlib.import_module(module_name)
+            imported = time.perf_counter()
+            self.game = getattr(module, class_name)(window)
+            self.import_seconds = imported - started
+            self.init_seconds = time.perf_counter() - imported
+        return self.game
+
+
+class GameRegistry:
+    def __init__(self):
+        self.entries: Dict[str, GameEntry] = {}
+        self.discovery_seconds: Optional[float] = None
+
+    def register(self, label: str, target: str):
+        self.entries[label] = GameEntry(label, target)
+
+    def copy(self) -> 'GameRegistry':
+        """Same games, not loaded yet, e.g. for another player."""
+        games = GameRegistry()
+        for entry in self:
+            games.register(entry.label, entry.target)
+        games.discovery_seconds = self.discovery_seconds
+        return games
+
+    def load_entry_points(self):
+        if self.discovery_seconds is not None:
+            return
+        started = time.perf_counter()
+        # Imported here as it takes longer than the rest of the startup
+        from importlib import metadata
+
+        for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name not in self.entries:
+                self.register(entry_point.name, entry_point.value)
+        self.discovery_seconds = time.perf_counter() - started
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def report(self) -> List[str]:
+        lines = []
+        if self.discovery_seconds is not None:
+            lines.append(
+                f'Plugin discovery: {self.discovery_seconds * 1000:.1f} ms'
+            )
+        return lines + [
+            f'{entry.label}: import {entry.import_seconds * 1000:.1f} ms, '
+            f'init {entry.init_seconds * 1000:.1f} ms'
+            if entry.game else f'{entry.label}: not loaded'
+            for entry in self
+        ]
+
+
+registry = GameRegistry()
+registry.register('Sudoku', 'sudoku.gui:SudokuMain')
+registry.register('Snake', 'snake.gui:SnakeMain')
@@ -1,26 +1,88 @@
+import argparse
 import curses
+import sys
+import time
+from typing import Optional
 
+from games import GameEntry, GameRegistry, registry
 from menu import Menu, MenuItem, MenuItemCallback
-from snake.gui import SnakeMain
-from sudoku.gui import SudokuMain
+from replay import GameKind, Replay
+from screen import CursesScreen
+
+# Games that play each kind of replay, by their label in the registry
+REPLAY_GAMES = {GameKind.sudoku: 'Sudoku', GameKind.snake: 'Snake'}
 
 
 class MainMenu:
-    def __init__(self, window):
+    def __init__(self, window, games: Optional[GameRegistry] = None):
+        started = time.perf_counter()
         self.window = window
+        # Games are created once per registry, sessions need their own
+        self.games = games or registry
         self.screen_sizes = self.window.getmaxyx()
-        curses.init_pair(99, curses.COLOR_WHITE, curses.COLOR_BLACK)
-        self.window.bkgd(' ', curses.color_pair(99))
-        sudoku_menu = SudokuMain(self.window).main_menu
-        snake_menu = SnakeMain(self.window).main_menu
+        self.window.init_pair(99, curses.COLOR_WHITE, curses.COLOR_BLACK)
+        self.window.bkgd(' ', self.window.color_pair(99))
+        self.games.load_entry_points()
         main_menu_items = [
-            MenuItem('Sudoku', MenuItemCallback(sudoku_menu.display)),
-            MenuItem('Snake', MenuItemCallback(snake_menu.display)),
-            MenuItem('Exit', MenuItemCallback(lambda: True))
+            MenuItem(
+                entry.label,
+                MenuItemCallback(self.open_game, {'entry': entry})
+            )
+            for entry in self.games
         ]
+        main_menu_items.append(
+            MenuItem('Exit', MenuItemCallback(lambda: True))
+        )
         self.main_menu = Menu(main_menu_items, self.window, self.screen_sizes)
+        self.startup_seconds = time.perf_counter() - started
         self.main_menu.display()
 
+    def open_game(self, **kwargs):
+        entry: GameEntry = kwargs['entry']
+        return entry.load(self.window).main_menu.display()
+
+
+def print_startup_report(main_menu: MainMenu):
+    print(
+        f'Main menu: init {main_menu.startup_seconds * 1000:.1f} ms',
+        *main_menu.games.report(), sep='\n', file=sys.stderr
+    )
+
+
+def play_replay(window, replay: Replay, start_tick: int = 0):
+    """Show `replay` from `start_tick`, then the menu of its game."""
+    games = registry.copy()
+    game = games.entries[REPLAY_GAMES[replay.kind]].load(window)
+    game.start_game(replay, start_tick)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Console games.')
+    parser.add_argument('--startup-report', action='store_true')
+    parser.add_argument(
+        '--replay', metavar='FILE', help='play a saved session'
+    )
+    parser.add_argument(
+        '--start-tick', type=int, default=0,
+        help='skip the replay to this tick without showing the ticks before'
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        if args.start_tick < 0:
+            parser.error('--start-tick can not be negative')
+        try:
+            replay = Replay.open(args.replay)
+            curses.wrapper(lambda window: play_replay(
+                CursesScreen(window), replay, args.start_tick
+            ))
+        except (OSError, ValueError) as error:
+            sys.exit(f'Can not play {args.replay}: {error}')
+        return
+    main_menu = curses.wrapper(lambda window: MainMenu(CursesScreen(window)))
+    if args.startup_report:
+        print_startup_report(main_menu)
+
 
 if __name__ == '__main__':
-    curses.wrapper(MainMenu)
+    main()
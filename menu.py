@@ -1,5 +1,4 @@
 import curses
-from curses import panel
 from typing import Optional, List, Callable, NamedTuple
 
 
@@ -22,18 +21,22 @@ class Menu:
         items: list,
         window,
         screen_sizes: tuple,
-        type_messages: Optional[List[Callable]] = None
+        banners: Optional[List[Callable[[], str]]] = None
     ):
         self.window = window
-        self.type_messages = type_messages
+        # Banners return text shown at the bottom, the first one lowest
+        self.banners = banners or []
         self.screen_sizes = screen_sizes
         self.window.keypad(1)
-        self.panel = panel.new_panel(self.window)
+        self.panel = self.window.new_panel()
         self.window.refresh()
 
         self.active_menu_item_index = 0
         self.items = items
         self.close_menu = False
+        # What is on the screen now: highlight per item, text per banner
+        self.rendered_items = {}
+        self.rendered_banners = {}
 
     def navigate(self, n: int):
         self.active_menu_item_index += n
@@ -42,9 +45,47 @@ class Menu:
         elif self.active_menu_item_index >= len(self.items):
             self.active_menu_item_index = 0
 
+    def invalidate(self):
+        """Forget what was drawn, e.g. after something else used the window."""
+        self.rendered_items.clear()
+        self.rendered_banners.clear()
+
+    def render(self, initial_y_position: int, initial_x_position: int):
+        """Draw only the items and banners that changed since last time."""
+        changed = False
+        for index, item in enumerate(self.items):
+            is_item_chosen = index == self.active_menu_item_index
+            if self.rendered_items.get(index) == is_item_chosen:
+                continue
+            self.window.addstr(
+                initial_y_position + index, initial_x_position,
+                item.label,
+                curses.A_REVERSE if is_item_chosen else curses.A_NORMAL
+            )
+            self.rendered_items[index] = is_item_chosen
+            changed = True
+
+        for index, banner in enumerate(self.banners):
+            message = banner()
+            if self.rendered_banners.get(index) == message:
+                continue
+            row = self.screen_sizes[0] - 2 - index
+            self.window.move(row, 0)
+            self.window.clrtoeol()
+            self.window.addstr(
+                row, (self.screen_sizes[1] - len(message)) // 2,
+                message, curses.A_BOLD
+            )
+            self.rendered_banners[index] = message
+            changed = True
+
+        if changed:
+            self.window.refresh()
+
     def display(self):
         self.window.clear()
         self.window.refresh()
+        self.invalidate()
         active_item = self.items[0]
         max_len_of_menu_item = max(len(item[0]) for item in self.items)
         initial_x_position = (
@@ -55,18 +96,7 @@ class Menu:
         ) // 2
 
         while not self.close_menu:
-            if self.type_messages:
-                for type_msg_func in self.type_messages:
-                    type_msg_func()
-            self.window.refresh()
-            for index, item in enumerate(self.items):
-                is_item_chosen = index == self.active_menu_item_index
-                menu_item_label = item[0]
-                self.window.addstr(
-                    initial_y_position + index, initial_x_position,
-                    menu_item_label,
-                    curses.A_REVERSE if is_item_chosen else curses.A_NORMAL
-                )
+            self.render(initial_y_position, initial_x_position)
 
             key = self.window.getch()
             active_item = self.items[self.active_menu_item_index]
@@ -75,6 +105,8 @@ class Menu:
                 self.close_menu = active_item.callback.func(
                     **active_item.callback.kwargs
                 )
+                # Submenus and games draw over the menu
+                self.invalidate()
             elif key == curses.KEY_UP:
                 self.navigate(-1)
             elif key == curses.KEY_DOWN:
@@ -89,6 +121,6 @@ class Menu:
     def hide(self):
         self.window.clear()
         self.panel.hide()
-        panel.update_panels()
-        curses.doupdate()
+        self.window.update_panels()
+        self.window.doupdate()
         self.window.refresh()
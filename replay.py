@@ -0,0 +1,188 @@
+import os
+import struct
+import time
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
+
+MAGIC = b'CGR'
+VERSION = 1
+HEADER = struct.Struct('<BBQ')
+# Sessions played in a terminal are saved here, set the variable to an
+# empty string to keep none.
+REPLAY_DIRECTORY = os.environ.get(
+    'CONSOLE_GAMES_REPLAYS',
+    os.path.join(os.path.expanduser('~'), '.console_games', 'replays')
+)
+
+
+class GameKind(int, Enum):
+    snake = 0
+    sudoku = 1
+
+
+# Game parameters recorded for every kind: board corners and level for
+# snake, level and hint settings for sudoku.
+PARAM_COUNTS = {GameKind.snake: 5, GameKind.sudoku: 3}
+
+
+class Event(NamedTuple):
+    tick: int
+    code: int
+
+
+def write_varint(buffer: bytearray, value: int):
+    if value < 0:
+        raise ValueError(f'Can not encode negative value: {value}')
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError('Replay is truncated')
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, position
+
+
+class Replay:
+    """
+    Session log: RNG seed, game parameters and one event per input.
+
+    Events are (tick, code) pairs with non-decreasing ticks. Serialized as
+    a fixed header followed by varints, ticks delta-encoded, so a long
+    session takes a couple of bytes per event.
+    """
+
+    def __init__(self, kind: GameKind, seed: int, params: tuple = ()):
+        self.kind = kind
+        self.seed = seed
+        self.params = params
+        self.events: List[Event] = []
+        # Length of the session in ticks, can be past the last event.
+        self.ticks = 0
+
+    def record(self, tick: int, code: int):
+        self.events.append(Event(tick, code))
+        self.ticks = max(self.ticks, tick + 1)
+
+    def dump(self) -> bytes:
+        buffer = bytearray(MAGIC)
+        buffer += HEADER.pack(VERSION, self.kind, self.seed)
+        write_varint(buffer, len(self.params))
+        for param in self.params:
+            write_varint(buffer, param)
+        write_varint(buffer, self.ticks)
+        write_varint(buffer, len(self.events))
+        previous_tick = 0
+        for tick, code in self.events:
+            write_varint(buffer, tick - previous_tick)
+            write_varint(buffer, code)
+            previous_tick = tick
+        return bytes(buffer)
+
+    @classmethod
+    def load(cls, data: bytes) -> 'Replay':
+        """Replay from `dump` output, ValueError if it is not valid."""
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a replay')
+        if len(data) < len(MAGIC) + HEADER.size:
+            raise ValueError('Replay is truncated')
+        version, kind, seed = HEADER.unpack_from(data, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(f'Unsupported replay version: {version}')
+        kind = GameKind(kind)
+        position = len(MAGIC) + HEADER.size
+
+        params = []
+        count, position = read_varint(data, position)
+        if count != PARAM_COUNTS[kind]:
+            raise ValueError(
+                f'Expected {PARAM_COUNTS[kind]} {kind.name} parameters, '
+                f'got {count}'
+            )
+        for _ in range(count):
+            param, position = read_varint(data, position)
+            params.append(param)
+        replay = cls(kind, seed, tuple(params))
+        ticks, position = read_varint(data, position)
+        count, position = read_varint(data, position)
+        tick = 0
+        for _ in range(count):
+            delta, position = read_varint(data, position)
+            code, position = read_varint(data, position)
+            tick += delta
+            replay.record(tick, code)
+        replay.ticks = ticks
+        return replay
+
+    def save(self, path: str):
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.dump())
+
+    @classmethod
+    def open(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as replay_file:
+            return cls.load(replay_file.read())
+
+
+def save_session(replay: Replay) -> Optional[str]:
+    """
+    Write `replay` to a new file in `REPLAY_DIRECTORY` and return its path,
+    None if nothing was played or the file could not be written.
+    """
+    if not REPLAY_DIRECTORY or not replay.ticks:
+        return None
+    path = os.path.join(REPLAY_DIRECTORY, (
+        f'{replay.kind.name}-{time.strftime("%Y%m%d-%H%M%S")}-'
+        f'{replay.seed}.replay'
+    ))
+    try:
+        os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+        replay.save(path)
+    except OSError:
+        # Losing the replay is better than losing the game over it
+        return None
+    return path
+
+
+class PlaybackScreen:
+    """
+    Screen wrapper feeding recorded key events to `getch`.
+
+    Events before `start_tick` are returned at once, the rest are spaced
+    as recorded, `tick_seconds` apart per tick. Once the events are over,
+    keys come from the wrapped screen again.
+    """
+
+    def __init__(
+        self, screen, replay: Replay, start_tick: int = 0,
+        tick_seconds: float = 0.01
+    ):
+        self.screen = screen
+        self.events = replay.events
+        self.start_tick = start_tick
+        self.tick_seconds = tick_seconds
+        self.position = 0
+        self.previous_tick = 0
+
+    def __getattr__(self, name):
+        return getattr(self.screen, name)
+
+    def getch(self) -> int:
+        if self.position >= len(self.events):
+            return self.screen.getch()
+        tick, code = self.events[self.position]
+        self.position += 1
+        if tick >= self.start_tick:
+            delay = tick - max(self.previous_tick, self.start_tick)
+            time.sleep(delay * self.tick_seconds)
+        self.previous_tick = tick
+        return code
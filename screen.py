@@ -0,0 +1,386 @@
+import curses
+import time
+from curses import panel
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+from replay import Replay, save_session
+
+Key = Union[int, str]
+
+# Line drawing characters used by `VirtualScreen.acs`, the same glyphs
+# curses shows for `curses.ACS_*` on a UTF-8 terminal.
+VIRTUAL_ACS = {
+    'VLINE': '│', 'HLINE': '─', 'ULCORNER': '┌', 'URCORNER': '┐',
+    'LLCORNER': '└', 'LRCORNER': '┘', 'TTEE': '┬', 'BTEE': '┴',
+    'LTEE': '├', 'RTEE': '┤', 'PLUS': '┼',
+}
+
+
+class KeysExhausted(Exception):
+    pass
+
+
+class CursesScreen:
+    """
+    Thin wrapper around a curses window.
+
+    Window methods are delegated as is, module level curses functions
+    (colors, beeps, panels) are exposed as methods so that games do not
+    need a real terminal to be driven.
+    """
+
+    def __init__(self, window):
+        self.window = window
+
+    def __getattr__(self, name):
+        return getattr(self.window, name)
+
+    def subwin(self, *args):
+        return CursesScreen(self.window.subwin(*args))
+
+    @staticmethod
+    def monotonic() -> float:
+        return time.monotonic()
+
+    @staticmethod
+    def acs(name: str):
+        return getattr(curses, f'ACS_{name}')
+
+    @staticmethod
+    def color_pair(number: int) -> int:
+        return curses.color_pair(number)
+
+    @staticmethod
+    def init_pair(number: int, foreground: int, background: int):
+        curses.init_pair(number, foreground, background)
+
+    @staticmethod
+    def curs_set(visibility: int):
+        curses.curs_set(visibility)
+
+    @staticmethod
+    def beep():
+        curses.beep()
+
+    @staticmethod
+    def doupdate():
+        curses.doupdate()
+
+    @staticmethod
+    def offload(func, *args):
+        """Run CPU heavy `func`, other screens may run it elsewhere."""
+        return func(*args)
+
+    @staticmethod
+    def save_replay(replay: Replay) -> Optional[str]:
+        """Keep a finished session, see `replay.save_session`."""
+        return save_session(replay)
+
+    def new_panel(self):
+        return panel.new_panel(self.window)
+
+    @staticmethod
+    def update_panels():
+        panel.update_panels()
+
+
+class Write(NamedTuple):
+    row: int
+    column: int
+    text: str
+    attrs: int
+
+
+class VirtualPanel:
+    def __init__(self):
+        self.hidden = False
+
+    def hide(self):
+        self.hidden = True
+
+    def show(self):
+        self.hidden = False
+
+
+class VirtualTerminal:
+    """State shared by a virtual screen and all of its subwindows."""
+
+    def __init__(self, rows: int, columns: int, keys: Iterable[Key]):
+        self.rows = rows
+        self.columns = columns
+        self.cells = {}
+        self.keys = iter(keys)
+        self.clock = 0.0
+        self.record = True
+        # Sessions are only written to files if asked for, so that scripted
+        # and served ones leave nothing behind.
+        self.save_replays = False
+        self.writes: List[Write] = []
+        self.write_calls = 0
+        self.bytes_written = 0
+        self.refreshes = 0
+        self.updates = 0
+        self.keys_read = 0
+        self.beeps = 0
+        # Color pairs set with `init_pair`, number to (foreground, background)
+        self.pairs = {}
+
+    def next_key(self, blocking: bool) -> int:
+        for key in self.keys:
+            if isinstance(key, str):
+                key = ord(key)
+            if key == -1 and blocking:
+                continue
+            self.keys_read += 1
+            return key
+        raise KeysExhausted
+
+    def getch(self, delay: int) -> int:
+        """Next key, -1 if none is pressed in `delay` ms (never if < 0)."""
+        key = self.next_key(blocking=delay < 0)
+        if key == -1:
+            self.clock += delay / 1000
+        return key
+
+    def monotonic(self) -> float:
+        return self.clock
+
+    def update(self):
+        self.updates += 1
+
+    def beep(self):
+        self.beeps += 1
+
+    @staticmethod
+    def offload(func, *args):
+        return func(*args)
+
+    def save_replay(self, replay: Replay) -> Optional[str]:
+        return save_session(replay) if self.save_replays else None
+
+
+class VirtualScreen:
+    """
+    In-memory screen with the subset of the curses window API the games use.
+
+    Writes are recorded (see `VirtualTerminal`), refreshes are counted and
+    `getch` reads from a scripted key stream. `-1` in the stream means
+    "no key pressed until the timeout", it advances the virtual clock
+    returned by `monotonic` by the window timeout. When the stream is
+    over, `getch` raises `KeysExhausted`.
+    """
+
+    def __init__(
+        self,
+        rows: int = 24,
+        columns: int = 80,
+        keys: Iterable[Key] = (),
+        terminal: Optional[VirtualTerminal] = None,
+        begin_row: int = 0,
+        begin_column: int = 0,
+    ):
+        self.terminal = terminal or VirtualTerminal(rows, columns, keys)
+        self.rows = rows
+        self.columns = columns
+        self.begin_row = begin_row
+        self.begin_column = begin_column
+        self.cursor = (0, 0)
+        self.delay = -1
+        self.background = ' '
+
+    def getmaxyx(self) -> tuple:
+        return self.rows, self.columns
+
+    def subwin(self, rows: int, columns: int, begin_row: int,
+               begin_column: int):
+        return VirtualScreen(
+            min(rows, self.terminal.rows - begin_row),
+            min(columns, self.terminal.columns - begin_column),
+            terminal=self.terminal,
+            begin_row=begin_row, begin_column=begin_column,
+        )
+
+    def _put(self, row: int, column: int, text: str, attrs: int = 0):
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            raise curses.error(f'Out of window: {(row, column)}')
+        terminal = self.terminal
+        terminal.write_calls += 1
+        if terminal.record:
+            terminal.writes.append(Write(
+                self.begin_row + row, self.begin_column + column, text, attrs
+            ))
+        terminal.bytes_written += len(text.encode())
+        for char in text:
+            if char == '\n':
+                self._clear_line(row, column)
+                row, column = row + 1, 0
+                continue
+            if column >= self.columns:
+                row, column = row + 1, 0
+            if row >= self.rows:
+                raise curses.error(f'Out of window: {(row, column)}')
+            terminal.cells[
+                self.begin_row + row, self.begin_column + column
+            ] = (char, attrs)
+            column += 1
+        self.cursor = (min(row, self.rows - 1), min(column, self.columns - 1))
+
+    def _clear_line(self, row: int, column: int):
+        for x in range(column, self.columns):
+            self.terminal.cells.pop(
+                (self.begin_row + row, self.begin_column + x), None
+            )
+
+    @staticmethod
+    def _char(char: Key) -> str:
+        return chr(char) if isinstance(char, int) else char
+
+    def addstr(self, *args):
+        if len(args) >= 3:
+            row, column, text, *attrs = args
+        else:
+            (row, column), (text, *attrs) = self.cursor, args
+        self._put(row, column, text, *attrs)
+
+    def addch(self, *args):
+        if len(args) >= 3:
+            row, column, char, *attrs = args
+        else:
+            (row, column), (char, *attrs) = self.cursor, args
+        self._put(row, column, self._char(char), *attrs)
+
+    def hline(self, row: int, column: int, char: Key, length: int):
+        length = min(length, self.columns - column)
+        self._put(row, column, self._char(char) * length)
+
+    def vline(self, row: int, column: int, char: Key, length: int):
+        for y in range(row, min(row + length, self.rows)):
+            self._put(y, column, self._char(char))
+
+    def border(self, *args):
+        self.box()
+
+    def box(self, *args):
+        last_row, last_column = self.rows - 1, self.columns - 1
+        self.hline(0, 1, self.acs('HLINE'), last_column - 1)
+        self.hline(last_row, 1, self.acs('HLINE'), last_column - 1)
+        self.vline(1, 0, self.acs('VLINE'), last_row - 1)
+        self.vline(1, last_column, self.acs('VLINE'), last_row - 1)
+        self._put(0, 0, self.acs('ULCORNER'))
+        self._put(0, last_column, self.acs('URCORNER'))
+        self._put(last_row, 0, self.acs('LLCORNER'))
+        self._put(last_row, last_column, self.acs('LRCORNER'))
+
+    def move(self, row: int, column: int):
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            raise curses.error(f'Out of window: {(row, column)}')
+        self.cursor = (row, column)
+
+    def clrtoeol(self):
+        self._clear_line(*self.cursor)
+
+    def clear(self):
+        for row in range(self.rows):
+            self._clear_line(row, 0)
+        self.cursor = (0, 0)
+
+    erase = clear
+
+    def bkgd(self, char: Key, attrs: int = 0):
+        self.background = self._char(char)
+
+    def keypad(self, flag):
+        pass
+
+    def timeout(self, delay: int):
+        self.delay = delay
+
+    def getch(self) -> int:
+        return self.terminal.getch(self.delay)
+
+    def refresh(self):
+        self.terminal.refreshes += 1
+        self.terminal.update()
+
+    def noutrefresh(self):
+        self.terminal.refreshes += 1
+
+    def doupdate(self):
+        self.terminal.update()
+
+    def monotonic(self) -> float:
+        return self.terminal.monotonic()
+
+    def offload(self, func, *args):
+        return self.terminal.offload(func, *args)
+
+    def save_replay(self, replay: Replay) -> Optional[str]:
+        return self.terminal.save_replay(replay)
+
+    @staticmethod
+    def acs(name: str) -> str:
+        return VIRTUAL_ACS[name]
+
+    @staticmethod
+    def color_pair(number: int) -> int:
+        return number << 8
+
+    def init_pair(self, number: int, foreground: int, background: int):
+        self.terminal.pairs[number] = (foreground, background)
+
+    def curs_set(self, visibility: int):
+        pass
+
+    def beep(self):
+        self.terminal.beep()
+
+    def new_panel(self):
+        return VirtualPanel()
+
+    def update_panels(self):
+        pass
+
+    def text(self) -> List[str]:
+        """Lines of the window as they would be seen on the terminal."""
+        cells = self.terminal.cells
+        return [
+            ''.join(
+                cells.get(
+                    (self.begin_row + y, self.begin_column + x),
+                    (self.background, 0)
+                )[0]
+                for x in range(self.columns)
+            ).rstrip()
+            for y in range(self.rows)
+        ]
+
+    def stats(self) -> dict:
+        terminal = self.terminal
+        return {
+            'writes': terminal.write_calls,
+            'bytes_written': terminal.bytes_written,
+            'refreshes': terminal.refreshes,
+            'updates': terminal.updates,
+            'keys_read': terminal.keys_read,
+        }
+
+
+def play_session(
+    app, keys: Iterable[Key], rows: int = 24, columns: int = 80,
+    record: bool = True,
+) -> dict:
+    """
+    Run `app(screen)` on a virtual screen until the scripted keys are over
+    or the app returns, and report how much work the terminal did.
+    """
+    screen = VirtualScreen(rows, columns, keys)
+    screen.terminal.record = record
+    started = time.perf_counter()
+    try:
+        app(screen)
+    except KeysExhausted:
+        pass
+    stats = screen.stats()
+    stats['seconds'] = time.perf_counter() - started
+    stats['seconds_per_key'] = stats['seconds'] / max(stats['keys_read'], 1)
+    return stats
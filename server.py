@@ -0,0 +1,485 @@
+"""
+Telnet server running a session of the games for every client.
+
+The event loop reads keys, runs the timers of `getch` and writes output
+for all clients, while each session runs in a thread of its own, so
+that the games keep their blocking `getch` loops. Most of the time such
+a thread sleeps, but it costs an OS thread and its stack, reserved
+whole (`threading.stack_size()`, by default the `ulimit -s` of the
+process, commonly 8 MB) even though only the pages used, usually a few
+tens of KB, take memory. So sessions are bounded by the thread limits
+and the address space of the process rather than by its CPU: the load
+reports give the stack reserved next to the sessions per core.
+
+Run `python server.py`, then connect with `telnet 127.0.0.1 2323`.
+"""
+import argparse
+import asyncio
+import curses
+import itertools
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from games import registry
+from main import MainMenu
+from screen import KeysExhausted, VirtualScreen, VirtualTerminal
+
+# Telnet: IAC WILL ECHO, IAC WILL SUPPRESS-GO-AHEAD puts clients into
+# character mode without local echo.
+IAC, SB, SE = 255, 250, 240
+WILL, WONT, DO, DONT = 251, 252, 253, 254
+TELNET_SETUP = bytes([IAC, WILL, 1, IAC, WILL, 3])
+# Clear the screen and hide the cursor; undone when the session ends.
+SCREEN_SETUP = b'\x1b[0m\x1b[2J\x1b[?25l'
+SCREEN_RESET = b'\x1b[0m\x1b[2J\x1b[H\x1b[?25h'
+
+ESCAPE_KEYS = {
+    b'A': curses.KEY_UP,
+    b'B': curses.KEY_DOWN,
+    b'C': curses.KEY_RIGHT,
+    b'D': curses.KEY_LEFT,
+}
+# Clients that read slower than this are dropped
+MAX_OUTPUT_BUFFER = 1 << 20
+LATENCY_HISTORY = 1024
+# glibc's thread stack size when `ulimit -s` is unlimited
+UNLIMITED_STACK_SIZE = 2 << 20
+
+
+def parse_input(buffer: bytearray) -> List[int]:
+    """
+    Take the keys out of the bytes a telnet client sent: skip telnet
+    commands, turn arrow escape sequences into curses key codes and Enter
+    into `\\n`. An incomplete sequence at the end is left in `buffer`.
+    """
+    keys = []
+    position = 0
+    while position < len(buffer):
+        byte = buffer[position]
+        if byte == IAC:
+            if position + 1 >= len(buffer):
+                break
+            command = buffer[position + 1]
+            if command == SB:
+                end = buffer.find(bytes([IAC, SE]), position)
+                if end < 0:
+                    break
+                position = end + 2
+            elif command in (WILL, WONT, DO, DONT):
+                if position + 2 >= len(buffer):
+                    break
+                position += 3
+            else:
+                position += 2
+        elif byte == 0x1b:
+            sequence = buffer[position + 1:position + 3]
+            if len(sequence) < 2 and sequence in (b'', b'[', b'O'):
+                break
+            if sequence[:1] in (b'[', b'O'):
+                key = ESCAPE_KEYS.get(bytes(sequence[1:]))
+                if key:
+                    keys.append(key)
+                position += 3
+            else:
+                keys.append(byte)
+                position += 1
+        elif byte == ord('\r'):
+            # Telnet sends Enter as CR LF or CR NUL
+            keys.append(ord('\n'))
+            if position + 1 >= len(buffer):
+                position += 1
+            elif buffer[position + 1] in (0, ord('\n')):
+                position += 2
+            else:
+                position += 1
+        else:
+            if byte:
+                keys.append(byte)
+            position += 1
+    del buffer[:position]
+    return keys
+
+
+def get_thread_stack_size() -> int:
+    """Bytes reserved for the stack of every new thread."""
+    size = threading.stack_size()
+    if size:
+        return size
+    size, _ = resource.getrlimit(resource.RLIMIT_STACK)
+    return UNLIMITED_STACK_SIZE if size == resource.RLIM_INFINITY else size
+
+
+def create_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool for `NetworkTerminal.offload`. Its workers start on the
+    first jobs, while sessions run, so they are not forked from the server:
+    they would keep the sockets of all clients open, and clients would
+    never see their sessions end. Forking a process with threads is not
+    safe either.
+    """
+    return ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('forkserver')
+    )
+
+
+def set_finished(finished: asyncio.Future):
+    # Cancelled already if the server is shutting down
+    if not finished.done():
+        finished.set_result(None)
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class TrackedCells(dict):
+    """Cell map that remembers which cells were set or cleared."""
+
+    def __init__(self):
+        super().__init__()
+        self.changed = set()
+
+    def __setitem__(self, key, value):
+        self.changed.add(key)
+        super().__setitem__(key, value)
+
+    def pop(self, key, *default):
+        self.changed.add(key)
+        return super().pop(key, *default)
+
+
+class Input(NamedTuple):
+    key: int
+    # Loop time the key came at, or the number of the timeout for -1
+    received: float = 0.0
+    timer: int = 0
+
+
+class NetworkTerminal(VirtualTerminal):
+    """
+    Terminal of one telnet client, used from the thread of its session.
+
+    Keys come from the event loop through `inbox`, and so do timeouts:
+    `getch` with a delay asks the loop for a timer, so ticks of all
+    sessions are scheduled by the one loop. Output is sent as ANSI escape
+    sequences when the session waits, for a key or for the process pool,
+    and only for the cells that changed since the last time. So a key
+    press takes one write however many refreshes it causes.
+    """
+
+    def __init__(
+        self, rows: int, columns: int, loop: asyncio.AbstractEventLoop,
+        writer: asyncio.StreamWriter, pool: Optional[Executor] = None
+    ):
+        super().__init__(rows, columns, ())
+        self.record = False
+        self.cells = TrackedCells()
+        # What the client shows now
+        self.shown = {}
+        self.loop = loop
+        self.writer = writer
+        self.pool = pool
+        self.inbox: queue.Queue = queue.Queue()
+        self.closed = False
+        self.timers = 0
+        self.output = bytearray()
+        self.styles: Dict[int, str] = {}
+        # Loop time of the last key read, until its output is sent
+        self.key_received: Optional[float] = None
+        # Seconds from a key coming in to the client being sent its output
+        self.latencies: deque = deque(maxlen=LATENCY_HISTORY)
+        self.bytes_sent = 0
+
+    # Called in the loop
+
+    def put_key(self, key: int):
+        self.inbox.put(Input(key, self.loop.time()))
+
+    def close(self):
+        self.inbox.put(None)
+
+    def _send(self, data: bytes, key_received: Optional[float]):
+        writer = self.writer
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_OUTPUT_BUFFER:
+            writer.close()
+            return
+        writer.write(data)
+        self.bytes_sent += len(data)
+        if key_received is not None:
+            self.latencies.append(self.loop.time() - key_received)
+
+    # Called in the session thread
+
+    def getch(self, delay: int) -> int:
+        self.flush()
+        self.key_received = None
+        if delay >= 0:
+            self.timers += 1
+            self.loop.call_soon_threadsafe(
+                self.loop.call_at, time.monotonic() + delay / 1000,
+                self.inbox.put, Input(-1, timer=self.timers)
+            )
+        while not self.closed:
+            item = self.inbox.get()
+            if item is None:
+                self.closed = True
+            elif item.key != -1:
+                self.keys_read += 1
+                self.key_received = item.received
+                return item.key
+            elif delay >= 0 and item.timer == self.timers:
+                return -1
+        raise KeysExhausted
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def beep(self):
+        self.beeps += 1
+        self.output += b'\a'
+
+    def offload(self, func, *args):
+        if self.pool is None:
+            return func(*args)
+        # Show what was drawn before the wait
+        self.flush()
+        return self.pool.submit(func, *args).result()
+
+    def _style(self, attrs: int) -> str:
+        style = self.styles.get(attrs)
+        if style is None:
+            codes = ['0']
+            if attrs & curses.A_BOLD:
+                codes.append('1')
+            if attrs & curses.A_UNDERLINE:
+                codes.append('4')
+            if attrs & curses.A_REVERSE:
+                codes.append('7')
+            pair = self.pairs.get((attrs & curses.A_COLOR) >> 8)
+            if pair:
+                codes += [f'3{pair[0]}', f'4{pair[1]}']
+            style = self.styles[attrs] = f'\x1b[{";".join(codes)}m'
+        return style
+
+    def flush(self):
+        changed = self.cells.changed
+        parts = []
+        cursor = style = None
+        for row, column in sorted(changed):
+            cell = self.cells.get((row, column))
+            if self.shown.get((row, column)) == cell:
+                continue
+            if cell is None:
+                self.shown.pop((row, column))
+                char, attrs = ' ', 0
+            else:
+                self.shown[row, column] = char, attrs = cell
+            if cursor != (row, column):
+                parts.append(f'\x1b[{row + 1};{column + 1}H')
+            if style != attrs:
+                parts.append(self._style(attrs))
+                style = attrs
+            parts.append(char)
+            cursor = row, column + 1
+        changed.clear()
+
+        data = self.output + ''.join(parts).encode()
+        self.output.clear()
+        if data:
+            self.loop.call_soon_threadsafe(
+                self._send, bytes(data), self.key_received
+            )
+            self.key_received = None
+
+
+class Session:
+    def __init__(self, number: int, peer, terminal: NetworkTerminal):
+        self.number = number
+        self.peer = peer
+        self.terminal = terminal
+        self.started = time.monotonic()
+
+    def report(self) -> str:
+        latencies = self.terminal.latencies
+        return (
+            f'Session {self.number} {self.peer}: '
+            f'{time.monotonic() - self.started:.0f} s, '
+            f'{self.terminal.keys_read} keys, '
+            f'{self.terminal.bytes_sent} bytes sent, latency '
+            f'p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms'
+        )
+
+
+class GameServer:
+    """
+    Serves `app(screen)` to every telnet client that connects, each in
+    a thread of its own reading keys from the event loop. The thread
+    only holds the state of its games: it sleeps between keys and ticks,
+    and CPU heavy work is sent to the shared process `pool`.
+    """
+
+    def __init__(
+        self, app: Callable, rows: int = 24, columns: int = 80,
+        pool: Optional[Executor] = None
+    ):
+        self.app = app
+        self.rows = rows
+        self.columns = columns
+        self.pool = pool
+        self.sessions: Dict[int, Session] = {}
+        self.numbers = itertools.count(1)
+        self.last_report = (time.monotonic(), time.process_time())
+
+    def run_session(self, session: Session, finished: asyncio.Future):
+        terminal = session.terminal
+        try:
+            self.app(VirtualScreen(
+                self.rows, self.columns, terminal=terminal
+            ))
+        except KeysExhausted:
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            terminal.output += SCREEN_RESET
+            terminal.flush()
+            terminal.loop.call_soon_threadsafe(set_finished, finished)
+
+    async def read_keys(
+        self, reader: asyncio.StreamReader, terminal: NetworkTerminal
+    ):
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+                for key in parse_input(buffer):
+                    terminal.put_key(key)
+        except ConnectionError:
+            pass
+        finally:
+            terminal.close()
+
+    async def serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        loop = asyncio.get_running_loop()
+        terminal = NetworkTerminal(
+            self.rows, self.columns, loop, writer, self.pool
+        )
+        session = Session(
+            next(self.numbers), writer.get_extra_info('peername'), terminal
+        )
+        self.sessions[session.number] = session
+        writer.write(TELNET_SETUP + SCREEN_SETUP)
+
+        finished = loop.create_future()
+        threading.Thread(
+            target=self.run_session, args=(session, finished),
+            name=f'session-{session.number}', daemon=True
+        ).start()
+        reading = asyncio.create_task(self.read_keys(reader, terminal))
+        try:
+            await finished
+        finally:
+            reading.cancel()
+            terminal.close()
+            del self.sessions[session.number]
+            print(session.report(), file=sys.stderr)
+            writer.close()
+
+    def report(self) -> List[str]:
+        """Load since the previous report and the sessions it served."""
+        now, cpu_time = time.monotonic(), time.process_time()
+        last_now, last_cpu_time = self.last_report
+        self.last_report = now, cpu_time
+        load = (cpu_time - last_cpu_time) / max(now - last_now, 1e-9)
+        sessions = len(self.sessions)
+        cores = os.cpu_count() or 1
+        stack_size = get_thread_stack_size()
+        lines = [
+            f'{sessions} sessions on {cores} cores: '
+            f'{sessions / cores:.2f} per core, '
+            f'server CPU load {load:.0%} of a core'
+            + (
+                f', ~{sessions / load:.0f} sessions per core at this load'
+                if sessions and load else ''
+            ),
+            f'{threading.active_count()} threads, a thread per session '
+            f'with {stack_size / (1 << 20):.1f} MB of stack reserved: '
+            f'{sessions * stack_size / (1 << 20):.0f} MB for sessions',
+        ]
+        return lines + [
+            session.report() for session in self.sessions.values()
+        ]
+
+    async def print_reports(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if self.sessions:
+                print(*self.report(), sep='\n', file=sys.stderr)
+
+    async def serve(self, host: str, port: int, report_interval: float = 0):
+        server = await asyncio.start_server(self.serve_client, host, port)
+        if report_interval:
+            asyncio.create_task(self.print_reports(report_interval))
+        print(
+            f'Serving on {host}:{port}, connect with `telnet {host} {port}`',
+            file=sys.stderr
+        )
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the games to telnet clients.'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2323)
+    parser.add_argument('--rows', type=int, default=24)
+    parser.add_argument('--columns', type=int, default=80)
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='processes for sudoku boards, one per core by default'
+    )
+    parser.add_argument(
+        '--report-interval', type=float, default=60,
+        help='seconds between load reports, 0 to turn them off'
+    )
+    args = parser.parse_args()
+
+    # Entry points are looked up once, sessions copy the result
+    registry.load_entry_points()
+    with create_pool(args.workers) as pool:
+        server = GameServer(
+            lambda screen: MainMenu(screen, registry.copy()),
+            args.rows, args.columns, pool
+        )
+        try:
+            asyncio.run(server.serve(
+                args.host, args.port, args.report_interval
+            ))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,517 @@
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from snake.backend import Coordinates, Direction, SnakeGame
+
+# Check the clock once per this many visited cells during a search.
+CLOCK_CHECK_INTERVAL = 64
+# Share of the board the snake fills when it moves onto the cycle for good.
+# Its body soon gets too tangled to be laid along the cycle.
+CYCLE_FILL = 0.1
+
+
+class PlanningTimeout(Exception):
+    pass
+
+
+class Autopilot:
+    """
+    Chooses moves for a `SnakeGame` within `budget` seconds per tick.
+
+    Cells are plain ints (`row * stride + column`) with precomputed
+    neighbours. Moves are chosen in this order:
+    - follow the cached path to the apple;
+    - take a new path from a BFS distance field grown from the apple.
+      The field is kept for as long as the apple stays, its search is
+      resumed on the next tick when the budget runs out, and it is only
+      rebuilt when a path taken from it turned out to be blocked;
+    - chase own tail;
+    - walk the Hamiltonian cycle of the board.
+    A path is accepted only if the tail is still reachable after eating.
+    The way to the tail found by that check, or by the tail chase, is kept
+    as an escape: the snake follows it when it runs out of time to plan,
+    as the body moves along it as foreseen.
+
+    Chasing the tail can go round in circles forever, so once the snake
+    fills `CYCLE_FILL` of the board, or after a board's worth of ticks
+    without an apple, it takes the shortest way onto the cycle from which
+    it can walk it with its whole body, and keeps to the cycle for the
+    rest of the game: laid along it the snake can not hit itself and
+    passes every cell once per lap. While it is shorter than half the
+    board it cuts across the cycle towards the apple, never past it nor
+    past its own tail, which keeps the body in the order of the cycle.
+    A stalled snake that can not join the cycle, or has none because both
+    sides of the board are odd, takes random safe moves, as chasing the
+    tail would bring it back to the same states.
+    """
+
+    def __init__(self, game: SnakeGame, budget: float):
+        self.game = game
+        self.budget = budget
+        self.stride = game.end_column
+        first_row, last_row = game.init_row + 1, game.end_row - 2
+        first_column, last_column = game.init_column + 1, game.end_column - 2
+        self.neighbours: Dict[int, List[int]] = {}
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                self.neighbours[self.to_cell(row, column)] = [
+                    self.to_cell(row + d_row, column + d_column)
+                    for d_row, d_column in (d.value for d in Direction)
+                    if first_row <= row + d_row <= last_row
+                    and first_column <= column + d_column <= last_column
+                ]
+        self.cycle = self._get_hamiltonian_cycle(
+            list(range(first_row, last_row + 1)),
+            list(range(first_column, last_column + 1)),
+        )
+        # Places of the cells along the cycle
+        self.positions: Dict[int, int] = {}
+        if self.cycle:
+            cell = next(iter(self.cycle))
+            for position in range(len(self.cycle)):
+                self.positions[cell] = position
+                cell = self.cycle[cell]
+
+        self.path: deque = deque()
+        # Verified cells to follow when planning runs out of time, and the
+        # score they hold until, past it the snake is longer than foreseen.
+        self.escape: deque = deque()
+        self.escape_score = 0
+        self.field_apple: Optional[int] = None
+        self.distances: Dict[int, int] = {}
+        self.frontier: deque = deque()
+        self.field_blocked: set = set()
+        self.deadline = 0.0
+
+        self.stalled = False
+        self.on_cycle = False
+        # The body follows the order of the cycle from the tail to the head
+        self.in_cycle_order = False
+        # Seeded, so that games stay reproducible
+        self.rng = random.Random(game.seed)
+        self.last_score = game.score
+        self.last_apple_tick = 0
+        self.patience = len(self.neighbours)
+
+        self.ticks = 0
+        self.stalls = 0
+        self.replans = 0
+        self.timeouts = 0
+        self.last_plan_time = 0.0
+        self.max_plan_time = 0.0
+        self.total_plan_time = 0.0
+
+    def to_cell(self, row: int, column: int) -> int:
+        return row * self.stride + column
+
+    def to_coordinates(self, cell: int) -> Coordinates:
+        row, column = divmod(cell, self.stride)
+        return Coordinates(row=row, column=column)
+
+    def to_direction(self, source: int, target: int) -> Direction:
+        source = self.to_coordinates(source)
+        target = self.to_coordinates(target)
+        return Direction(
+            (target.row - source.row, target.column - source.column)
+        )
+
+    @property
+    def mean_plan_time(self) -> float:
+        return self.total_plan_time / max(self.ticks, 1)
+
+    def _get_hamiltonian_cycle(
+        self, rows: List[int], columns: List[int]
+    ) -> Optional[Dict[int, int]]:
+        """
+        Cycle through every playable cell: zigzag over columns (or rows,
+        when only their number is even) next to a return lane on the first
+        row (column). Does not exist if both sides are odd.
+        """
+        transposed = len(columns) % 2 != 0
+        if transposed:
+            rows, columns = columns, rows
+        if len(columns) % 2 != 0 or len(rows) < 2:
+            return None
+
+        order = []
+        for index, column in enumerate(columns):
+            lane = rows[1:] if index % 2 == 0 else rows[:0:-1]
+            order.extend((row, column) for row in lane)
+        order.extend((rows[0], column) for column in reversed(columns))
+        cells = [
+            self.to_cell(column, row) if transposed
+            else self.to_cell(row, column)
+            for row, column in order
+        ]
+        return {
+            cell: cells[(index + 1) % len(cells)]
+            for index, cell in enumerate(cells)
+        }
+
+    def _check_clock(self, visited: int):
+        if (
+            visited % CLOCK_CHECK_INTERVAL == 0
+            and time.perf_counter() > self.deadline
+        ):
+            raise PlanningTimeout
+
+    @staticmethod
+    def _get_releases(cells: List[int]) -> Dict[int, int]:
+        # Ticks until a body cell can be entered. The head is pushed before
+        # the tail end is popped, so the last segment holds for one tick.
+        length = len(cells)
+        return {cell: length - index for index, cell in enumerate(cells)}
+
+    def _search(
+        self, source: int, target: int, releases: Dict[int, int]
+    ) -> Optional[List[int]]:
+        """Shortest path from `source` (excluded) to `target` by BFS."""
+        parents = {source: None}
+        queue = deque([(source, 0)])
+        visited = 0
+        while queue:
+            cell, distance = queue.popleft()
+            if cell == target:
+                path = []
+                while cell != source:
+                    path.append(cell)
+                    cell = parents[cell]
+                path.reverse()
+                return path
+            visited += 1
+            self._check_clock(visited)
+            for neighbour in self.neighbours[cell]:
+                if (
+                    neighbour not in parents
+                    and releases.get(neighbour, 0) <= distance
+                ):
+                    parents[neighbour] = cell
+                    queue.append((neighbour, distance + 1))
+        return None
+
+    def _reset_field(self, apple: int, body: List[int]):
+        self.replans += 1
+        self.field_apple = apple
+        self.distances = {apple: 0}
+        self.frontier = deque([apple])
+        self.field_blocked = set(body[:-1])
+
+    def _grow_field(self):
+        distances, frontier = self.distances, self.frontier
+        visited = 0
+        while frontier:
+            visited += 1
+            self._check_clock(visited)
+            cell = frontier.popleft()
+            distance = distances[cell] + 1
+            for neighbour in self.neighbours[cell]:
+                if (
+                    neighbour not in distances
+                    and neighbour not in self.field_blocked
+                ):
+                    distances[neighbour] = distance
+                    frontier.append(neighbour)
+
+    def _path_from_field(self, head: int) -> Optional[List[int]]:
+        distances = self.distances
+        cell = min(
+            (n for n in self.neighbours[head] if n in distances),
+            key=distances.__getitem__, default=None
+        )
+        if cell is None:
+            return None
+        path = [cell]
+        while distances[cell]:
+            cell = next(
+                n for n in self.neighbours[cell]
+                if distances.get(n) == distances[cell] - 1
+            )
+            path.append(cell)
+        return path
+
+    def _get_escape(
+        self, path: List[int], body: List[int]
+    ) -> Optional[List[int]]:
+        """
+        `path` followed by the way to the tail after eating at its end and
+        the body from the tail on, None if `path` is not safe.
+        """
+        releases = self._get_releases(body)
+        if any(
+            releases.get(cell, 0) > tick for tick, cell in enumerate(path)
+        ):
+            return None
+        # Body after following `path` and eating the apple at its end.
+        new_body = (path[::-1] + body)[:len(body) + 1]
+        tail_path = self._search(
+            new_body[0], new_body[-1], self._get_releases(new_body)
+        )
+        if tail_path is None:
+            return None
+        # The tail is never next to the head there, so every cell of the
+        # body is free by the time the head gets to it.
+        return path + tail_path + new_body[-2::-1]
+
+    def _set_escape(self, cells: List[int], apples: int):
+        self.escape = deque(cells)
+        self.escape_score = self.game.score + apples
+
+    def _follow_escape(self, head: int) -> Optional[int]:
+        if (
+            not self.escape
+            or self.game.score > self.escape_score
+            or self.to_coordinates(self.escape[0]) in self.game.snake.occupied
+        ):
+            self.escape.clear()
+            return None
+        return self.escape[0]
+
+    def _follow_path(self, head: int) -> Optional[int]:
+        if self.path and self.path[0] == head:
+            self.path.popleft()
+        if (
+            not self.path
+            or self.path[-1] != self.field_apple
+            or self.path[0] not in self.neighbours[head]
+            or self.to_coordinates(self.path[0]) in self.game.snake.occupied
+        ):
+            self.path.clear()
+            return None
+        return self.path[0]
+
+    def _plan(self, head: int, body: List[int], apple: int) -> Optional[int]:
+        if apple != self.field_apple:
+            self._reset_field(apple, body)
+        self._grow_field()
+        path = self._path_from_field(head)
+        if path is None:
+            return None
+        escape = self._get_escape(path, body)
+        if escape is None:
+            # The field was grown around an older body, start a fresh one
+            # on the next tick.
+            self.field_apple = None
+            return None
+        self.path = deque(path)
+        self._set_escape(escape, 1)
+        return path[0]
+
+    def _follow_tail(self, head: int, body: List[int]) -> Optional[int]:
+        # Eating on the way would grow the snake and keep the tail end in
+        # place, closing the way behind the head, so apples are gone round
+        # if they can be.
+        releases = self._get_releases(body)
+        around = dict(releases)
+        for apple in self.game.snake.apples:
+            around[self.to_cell(apple.row, apple.column)] = len(
+                self.neighbours
+            )
+        path = (
+            self._search(head, body[-1], around)
+            or self._search(head, body[-1], releases)
+        )
+        if path is None:
+            return None
+        self._set_escape(path + body[-2::-1], 0)
+        return path[0]
+
+    def _get_grown_releases(self, cells: List[int]) -> Dict[int, int]:
+        # As if the snake grew right away, in case it eats on the way.
+        return {
+            cell: release + 1
+            for cell, release in self._get_releases(cells).items()
+        }
+
+    def _fits_cycle(
+        self, path: List[int], body: List[int], releases: Dict[int, int]
+    ) -> bool:
+        # After `path` every cell of the cycle must be free by the time
+        # the head gets there, until the body is laid along it. Following
+        # the path brings the releases of the body now `len(path)` ticks
+        # closer, and the path itself becomes the front of the body.
+        length = len(body)
+        on_path = {
+            cell: length - len(path) + index + 2
+            for index, cell in enumerate(path)
+        }
+        cell = path[-1] if path else body[0]
+        for tick in range(length + 1):
+            cell = self.cycle[cell]
+            release = on_path.get(cell)
+            if release is None:
+                release = releases.get(cell, 0) - len(path)
+            if release > tick:
+                return False
+        return True
+
+    def _join_cycle(self, head: int, body: List[int]) -> Optional[int]:
+        """First move of the shortest way onto the cycle, if there is one."""
+        releases = self._get_grown_releases(body)
+        parents = {head: None}
+        queue = deque([(head, 0)])
+        visited = 0
+        while queue:
+            cell, distance = queue.popleft()
+            visited += 1
+            self._check_clock(visited)
+            path = []
+            while cell != head:
+                path.append(cell)
+                cell = parents[cell]
+            path.reverse()
+            if self._fits_cycle(path, body, releases):
+                self.on_cycle = True
+                self.path = deque(path)
+                return path[0] if path else self.cycle[head]
+            cell = path[-1] if path else head
+            for neighbour in self.neighbours[cell]:
+                if (
+                    neighbour not in parents
+                    and releases.get(neighbour, 0) <= distance
+                ):
+                    parents[neighbour] = cell
+                    queue.append((neighbour, distance + 1))
+        return None
+
+    def _follow_cycle(self, head: int, body: List[int]) -> Optional[int]:
+        if self.path and self.path[0] == head:
+            self.path.popleft()
+        size = len(self.cycle)
+        tail = self.positions[body[-1]]
+
+        def get_offset(cell: int) -> int:
+            return (self.positions[cell] - tail) % size
+
+        if not self.in_cycle_order:
+            self.in_cycle_order = not self.path and all(
+                get_offset(cell) > get_offset(next_cell)
+                for cell, next_cell in zip(body, body[1:])
+            )
+        if not self.in_cycle_order:
+            # Joining allowed for one apple on the way, check again in
+            # case there were more.
+            path = list(self.path)
+            releases = self._get_grown_releases(body)
+            if any(
+                releases.get(cell, 0) > tick for tick, cell in enumerate(path)
+            ) or not self._fits_cycle(path, body, releases):
+                self.on_cycle = False
+                self.path.clear()
+                return None
+            return path[0] if path else self.cycle[head]
+
+        apples = self.game.snake.apples
+        cell = self.cycle[head]
+        if not apples:
+            return cell
+        # Cells ahead of the head up to the tail are free, so the head can
+        # skip some of them as long as it does not skip the apple. Skipped
+        # cells are only ahead again once the tail passes them, so the head
+        # stays in the first half of the cycle from the tail, leaving the
+        # other half for the snake to grow into.
+        head_offset = get_offset(head)
+        apple = self.to_cell(apples[0].row, apples[0].column)
+        apple_offset = get_offset(apple)
+        for neighbour in self.neighbours[head]:
+            offset = get_offset(neighbour)
+            if (
+                get_offset(cell) < offset <= apple_offset
+                and head_offset < offset and 2 * offset < size
+            ):
+                cell = neighbour
+        return cell
+
+    def _wander(self, head: int, body: List[int]) -> Optional[int]:
+        escapes = {}
+        for cell in self.neighbours[head]:
+            escape = self._get_escape([cell], body)
+            if escape:
+                escapes[cell] = escape
+        if not escapes:
+            return None
+        if self.cycle and self.cycle[head] in escapes:
+            cell = self.cycle[head]
+        else:
+            cell = self.rng.choice(list(escapes))
+        self._set_escape(escapes[cell], 1)
+        return cell
+
+    def _check_progress(self):
+        if self.game.score != self.last_score:
+            self.last_score = self.game.score
+            self.last_apple_tick = self.ticks
+            self.stalled = False
+        elif (
+            not self.stalled
+            and self.ticks - self.last_apple_tick > self.patience
+        ):
+            self.stalled = True
+            self.stalls += 1
+
+    def _survive(self, head: int, body: List[int]) -> Optional[int]:
+        occupied = set(body)
+        if self.cycle and self.cycle.get(head) not in occupied:
+            return self.cycle[head]
+        for cell in self.neighbours[head]:
+            if cell not in occupied:
+                return cell
+        return None
+
+    def _get_body(self) -> List[int]:
+        return [
+            self.to_cell(c.row, c.column)
+            for c in self.game.snake.snake_coordinates
+        ]
+
+    def choose(self) -> Direction:
+        started = time.perf_counter()
+        self.deadline = started + self.budget
+        snake = self.game.snake
+        head = self.to_cell(snake.head.row, snake.head.column)
+
+        self._check_progress()
+        if self.escape and self.escape[0] == head:
+            self.escape.popleft()
+        else:
+            # Gone off it for a better move
+            self.escape.clear()
+        if self.on_cycle:
+            cell = self._follow_cycle(head, self._get_body())
+        elif self.stalled:
+            cell = None
+        else:
+            cell = self._follow_path(head)
+        if cell is None:
+            body = self._get_body()
+            try:
+                if self.stalled:
+                    cell = self._wander(head, body)
+                elif snake.apples:
+                    apple = snake.apples[0]
+                    cell = self._plan(
+                        head, body, self.to_cell(apple.row, apple.column)
+                    )
+                if cell is None:
+                    cell = self._follow_tail(head, body)
+                if self.cycle and (
+                    self.stalled
+                    or len(body) >= CYCLE_FILL * len(self.neighbours)
+                ):
+                    # The move above is kept if the way onto the cycle is
+                    # not found in time.
+                    cell = self._join_cycle(head, body) or cell
+            except PlanningTimeout:
+                self.timeouts += 1
+                cell = cell or self._follow_escape(head)
+            if cell is None:
+                cell = self._survive(head, body)
+
+        self.ticks += 1
+        self.last_plan_time = time.perf_counter() - started
+        self.max_plan_time = max(self.max_plan_time, self.last_plan_time)
+        self.total_plan_time += self.last_plan_time
+        if cell is None:
+            return self.game.direction
+        return self.to_direction(head, cell)
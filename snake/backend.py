@@ -1,5 +1,11 @@
 import random
-from typing import NamedTuple, List
+from collections import deque
+from enum import Enum
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, NamedTuple, List, Optional
+
+from replay import Replay
 
 
 class Coordinates(NamedTuple):
@@ -7,10 +13,67 @@ class Coordinates(NamedTuple):
     row: int
 
 
+class FreeCells:
+    """
+    Cells available for apples: a list for uniform O(1) random choice
+    plus a map of cell to its list position for O(1) swap-remove.
+    """
+
+    def __init__(self, cells: Iterable[Coordinates]):
+        self.cells = list(cells)
+        self.positions = {cell: i for i, cell in enumerate(self.cells)}
+
+    def copy(self) -> 'FreeCells':
+        free_cells = FreeCells(())
+        free_cells.cells = self.cells.copy()
+        free_cells.positions = self.positions.copy()
+        return free_cells
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __contains__(self, cell: Coordinates) -> bool:
+        return cell in self.positions
+
+    def add(self, cell: Coordinates):
+        if cell in self.positions:
+            return
+        self.positions[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def remove(self, cell: Coordinates):
+        position = self.positions.pop(cell, None)
+        if position is None:
+            return
+        last_cell = self.cells.pop()
+        if position < len(self.cells):
+            self.cells[position] = last_cell
+            self.positions[last_cell] = position
+
+    def choice(self, rng: random.Random) -> Optional[Coordinates]:
+        if not self.cells:
+            return None
+        return self.cells[rng.randrange(len(self.cells))]
+
+
+@lru_cache(maxsize=16)
+def get_apple_area(
+    init_row: int, init_column: int, end_row: int, end_column: int
+) -> FreeCells:
+    # Built once per board size, snakes start from a copy of it.
+    return FreeCells(
+        Coordinates(column, row)
+        for row in range(init_row + 3, end_row - 2)
+        for column in range(init_column + 3, end_column - 2)
+    )
+
+
 class Snake:
     def __init__(
-        self, init_row: int, init_column: int, end_row: int, end_column: int
+        self, init_row: int, init_column: int, end_row: int, end_column: int,
+        rng: Optional[random.Random] = None
     ):
+        self.rng = rng or random.Random()
         self.init_row = init_row
         self.init_column = init_column
         self.end_row = end_row
@@ -18,16 +81,41 @@ class Snake:
 
         head_column = (end_column - init_column) // 2
         head_row = (end_row - init_row) // 2
-        self.snake_coordinates = [
+        # Head is the left end of the deque, `occupied` mirrors its cells
+        # so that occupancy checks do not depend on the snake length.
+        self.snake_coordinates = deque([
             Coordinates(head_column, head_row),
             Coordinates(head_column - 1, head_row),
             Coordinates(head_column - 2, head_row),
-        ]
-        self.apples = [self.generate_apple()]
+        ])
+        self.occupied = set(self.snake_coordinates)
+        self.stuck_with_self = False
+        self.free_cells = get_apple_area(
+            init_row, init_column, end_row, end_column
+        ).copy()
+        for coordinates in self.snake_coordinates:
+            self.free_cells.remove(coordinates)
+        apple = self.generate_apple()
+        self.apples = [apple] if apple else []
+
+    def push_head(self, coordinates: Coordinates):
+        if coordinates in self.occupied:
+            self.stuck_with_self = True
+        self.snake_coordinates.appendleft(coordinates)
+        self.occupied.add(coordinates)
+        self.free_cells.remove(coordinates)
+
+    def pop_tail(self) -> Coordinates:
+        tail_end = self.snake_coordinates.pop()
+        if not self.stuck_with_self:
+            self.occupied.discard(tail_end)
+            if self.is_in_apple_area(tail_end):
+                self.free_cells.add(tail_end)
+        return tail_end
 
     def move_down(self):
-        self.snake_coordinates.insert(
-            0, Coordinates(row=self.head.row + 1, column=self.head.column)
+        self.push_head(
+            Coordinates(row=self.head.row + 1, column=self.head.column)
         )
 
     @property
@@ -36,18 +124,29 @@ class Snake:
 
     @property
     def tail(self) -> List[Coordinates]:
-        return self.snake_coordinates[1:]
-
-    def generate_apple(self):
-        apple = None
-        while not apple:
-            column = random.randint(self.init_column + 3, self.end_column - 3)
-            row = random.randint(self.init_row + 3, self.end_row - 3)
-            apple_coordinate = Coordinates(column, row)
-            if apple_coordinate not in self.snake_coordinates:
-                apple = apple_coordinate
+        return list(islice(self.snake_coordinates, 1, None))
+
+    def is_in_apple_area(self, coordinates: Coordinates) -> bool:
+        return (
+            self.init_row + 3 <= coordinates.row <= self.end_row - 3
+            and self.init_column + 3 <= coordinates.column
+            <= self.end_column - 3
+        )
+
+    def generate_apple(self) -> Optional[Coordinates]:
+        # None means there is no free cell left, i.e. the game is won.
+        return self.free_cells.choice(self.rng)
+
+    def respawn_apple(self, eaten: Coordinates) -> Optional[Coordinates]:
+        self.apples.remove(eaten)
+        apple = self.generate_apple()
+        if apple:
+            self.apples.append(apple)
         return apple
 
+    def is_board_full(self) -> bool:
+        return not self.free_cells
+
     def is_stuck_in_borders(self, max_rows: int, max_columns: int) -> bool:
         head_coordinates = self.head
         return (
@@ -58,4 +157,114 @@ class Snake:
         )
 
     def is_stuck_with_self(self) -> bool:
-        return self.head in self.tail
+        return self.stuck_with_self
+
+
+class Direction(Enum):
+    # (row, column) offsets of one move
+    up = (-1, 0)
+    down = (1, 0)
+    left = (0, -1)
+    right = (0, 1)
+
+    @property
+    def opposite(self) -> 'Direction':
+        row, column = self.value
+        return Direction((-row, -column))
+
+
+class StepResult(NamedTuple):
+    snake: Snake
+    reward: int
+    done: bool
+
+
+class SnakeGame:
+    """
+    Rules of the game without any drawing: deterministic for a given seed,
+    so games can be simulated as fast as `step` can be called.
+    """
+
+    def __init__(
+        self, init_row: int, init_column: int, end_row: int, end_column: int,
+        seed: Optional[int] = None
+    ):
+        self.init_row = init_row
+        self.init_column = init_column
+        self.end_row = end_row
+        self.end_column = end_column
+        self.seed = seed
+        self.reset(seed)
+
+    def reset(self, seed: Optional[int] = None) -> Snake:
+        if seed is None:
+            # Keep the seed known, so that any game can be replayed.
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.snake = Snake(
+            self.init_row, self.init_column, self.end_row, self.end_column,
+            random.Random(seed)
+        )
+        self.direction = Direction.right
+        self.score = 0
+        self.ticks = 0
+        # No room for an apple, e.g. on a small terminal: the game is won
+        # before it starts, as in `BatchSnakeGame`.
+        self.done = self.won = self.snake.is_board_full()
+        # Cell freed by the last step, if the snake did not grow
+        self.vacated: Optional[Coordinates] = None
+        return self.snake
+
+    def step(self, action: Optional[Direction] = None) -> StepResult:
+        """
+        Move the snake one cell. `action` changes the direction unless it
+        is None or opposite to the current one. Reward is 1 for an apple,
+        -1 for a crash and 0 otherwise.
+        """
+        if self.done:
+            return StepResult(self.snake, 0, True)
+        if action is not None and action != self.direction.opposite:
+            self.direction = action
+
+        snake = self.snake
+        row, column = self.direction.value
+        snake.push_head(Coordinates(
+            row=snake.head.row + row, column=snake.head.column + column
+        ))
+        self.ticks += 1
+        self.vacated = None
+
+        if (
+            snake.is_stuck_in_borders(self.end_row, self.end_column)
+            or snake.is_stuck_with_self()
+        ):
+            self.done = True
+            return StepResult(snake, -1, True)
+        if snake.head in snake.apples:
+            self.score += 1
+            if snake.respawn_apple(snake.head) is None:
+                self.done = self.won = True
+            return StepResult(snake, 1, self.done)
+        self.vacated = snake.pop_tail()
+        return StepResult(snake, 0, False)
+
+
+# Codes of direction changes in replays
+DIRECTIONS_BY_CODE = list(Direction)
+DIRECTION_CODES = {
+    direction: code for code, direction in enumerate(DIRECTIONS_BY_CODE)
+}
+
+
+def replay_game(replay: Replay, ticks: Optional[int] = None) -> SnakeGame:
+    """Re-simulate a recorded game up to `ticks` (whole game by default)."""
+    init_row, init_column, end_row, end_column = replay.params[:4]
+    game = SnakeGame(
+        init_row, init_column, end_row, end_column, seed=replay.seed
+    )
+    actions = {tick: code for tick, code in replay.events}
+    ticks = replay.ticks if ticks is None else min(ticks, replay.ticks)
+    while game.ticks < ticks and not game.done:
+        code = actions.get(game.ticks)
+        game.step(None if code is None else DIRECTIONS_BY_CODE[code])
+    return game
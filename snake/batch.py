@@ -0,0 +1,165 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from snake.backend import Direction
+
+# Action codes are indexes in `DIRECTIONS`, -1 keeps the current direction.
+DIRECTIONS = (Direction.up, Direction.down, Direction.left, Direction.right)
+ROW_OFFSETS = np.array([d.value[0] for d in DIRECTIONS], dtype=np.int64)
+COLUMN_OFFSETS = np.array([d.value[1] for d in DIRECTIONS], dtype=np.int64)
+OPPOSITE_ACTIONS = np.array(
+    [DIRECTIONS.index(d.opposite) for d in DIRECTIONS], dtype=np.int8
+)
+INITIAL_LENGTH = 3
+
+
+class BatchSnakeGame:
+    """
+    `SnakeGame` rules for many independent boards advanced in lockstep.
+
+    Every board is `rows` x `columns` with the border on the outer cells,
+    like `SnakeGame(0, 0, rows, columns)`. State lives in arrays indexed by
+    board: `occupancy` grids, a ring buffer of flat body cells per board
+    (head at `head_pointers`), head positions and apples. `step` updates all
+    boards with array operations only.
+    """
+
+    def __init__(
+        self, boards: int, rows: int, columns: int,
+        seed: Optional[int] = None, autoreset: bool = False
+    ):
+        self.boards = boards
+        self.rows = rows
+        self.columns = columns
+        self.cells = rows * columns
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng(seed)
+
+        self.occupancy = np.zeros((boards, rows, columns), dtype=bool)
+        self.body = np.zeros((boards, self.cells), dtype=np.int32)
+        self.head_pointers = np.zeros(boards, dtype=np.int64)
+        self.lengths = np.zeros(boards, dtype=np.int64)
+        self.head_rows = np.zeros(boards, dtype=np.int64)
+        self.head_columns = np.zeros(boards, dtype=np.int64)
+        self.directions = np.zeros(boards, dtype=np.int8)
+        self.apples = np.zeros(boards, dtype=np.int64)
+        self.scores = np.zeros(boards, dtype=np.int64)
+        self.ticks = np.zeros(boards, dtype=np.int64)
+        self.dones = np.zeros(boards, dtype=bool)
+        self.wins = np.zeros(boards, dtype=bool)
+
+        # Same apple area as `Snake.is_in_apple_area`
+        apple_area = np.zeros((rows, columns), dtype=bool)
+        apple_area[3:rows - 2, 3:columns - 2] = True
+        self.apple_area = apple_area.reshape(-1)
+        self.reset()
+
+    @property
+    def flat_occupancy(self) -> np.ndarray:
+        return self.occupancy.reshape(self.boards, self.cells)
+
+    def reset(self, mask: Optional[np.ndarray] = None):
+        boards = (
+            np.arange(self.boards) if mask is None else np.flatnonzero(mask)
+        )
+        if not len(boards):
+            return
+        head_row, head_column = self.rows // 2, self.columns // 2
+        self.occupancy[boards] = False
+        self.occupancy[boards, head_row, head_column - 2:head_column + 1] = (
+            True
+        )
+        # Ring buffer goes from the tail end (index 0) to the head.
+        head_cell = head_row * self.columns + head_column
+        self.body[boards, :INITIAL_LENGTH] = np.arange(
+            head_cell - INITIAL_LENGTH + 1, head_cell + 1
+        )
+        self.head_pointers[boards] = INITIAL_LENGTH - 1
+        self.lengths[boards] = INITIAL_LENGTH
+        self.head_rows[boards] = head_row
+        self.head_columns[boards] = head_column
+        self.directions[boards] = DIRECTIONS.index(Direction.right)
+        self.scores[boards] = 0
+        self.ticks[boards] = 0
+        self.dones[boards] = False
+        self.wins[boards] = False
+        self._spawn_apples(boards)
+
+    def _spawn_apples(self, boards: np.ndarray):
+        # Uniform draw over free apple cells of every board at once: the
+        # free cell with the largest random key wins.
+        free = self.apple_area & ~self.flat_occupancy[boards]
+        keys = self.rng.random(free.shape)
+        keys[~free] = -1
+        apples = keys.argmax(axis=1)
+        self.apples[boards] = apples
+        full = ~free[np.arange(len(boards)), apples]
+        self.wins[boards[full]] = True
+        self.dones[boards[full]] = True
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Advance every board by one tick. Returns `(rewards, dones)` with the
+        same meaning as `SnakeGame.step`. Finished boards stay untouched
+        until `reset`, or are reset right away with `autoreset`.
+        """
+        actions = np.asarray(actions, dtype=np.int8)
+        boards = np.flatnonzero(~self.dones)
+        rewards = np.zeros(self.boards, dtype=np.int64)
+
+        action = actions[boards]
+        direction = self.directions[boards]
+        turn = (action >= 0) & (action != OPPOSITE_ACTIONS[direction])
+        direction = np.where(turn, action, direction)
+        self.directions[boards] = direction
+
+        rows = self.head_rows[boards] + ROW_OFFSETS[direction]
+        columns = self.head_columns[boards] + COLUMN_OFFSETS[direction]
+        cells = rows * self.columns + columns
+        crashed = (
+            (rows <= 0) | (rows >= self.rows - 1)
+            | (columns <= 0) | (columns >= self.columns - 1)
+        )
+        flat_occupancy = self.flat_occupancy
+        crashed[~crashed] = flat_occupancy[
+            boards[~crashed], cells[~crashed]
+        ]
+        self.ticks[boards] += 1
+        rewards[boards[crashed]] = -1
+        self.dones[boards[crashed]] = True
+
+        moving = ~crashed
+        boards, rows, columns, cells = (
+            boards[moving], rows[moving], columns[moving], cells[moving]
+        )
+        ate = cells == self.apples[boards]
+
+        capacity = self.cells
+        pointers = (self.head_pointers[boards] + 1) % capacity
+        self.head_pointers[boards] = pointers
+        self.body[boards, pointers] = cells
+        flat_occupancy[boards, cells] = True
+        self.head_rows[boards] = rows
+        self.head_columns[boards] = columns
+
+        growing = boards[ate]
+        self.lengths[growing] += 1
+        self.scores[growing] += 1
+        rewards[growing] = 1
+
+        shrinking = boards[~ate]
+        tail_pointers = (
+            self.head_pointers[shrinking] - self.lengths[shrinking]
+        ) % capacity
+        flat_occupancy[shrinking, self.body[shrinking, tail_pointers]] = (
+            False
+        )
+
+        if len(growing):
+            self._spawn_apples(growing)
+
+        dones = self.dones.copy()
+        if self.autoreset:
+            self.reset(dones)
+        return rewards, dones
@@ -1,14 +1,43 @@
 import curses
+from collections import deque
 from enum import Enum
+from typing import Optional
 
+from clock import GameClock
 from menu import MenuItem, MenuItemCallback, Menu
-from snake.backend import Snake, Coordinates
+from replay import GameKind, Replay
+from snake.autopilot import Autopilot
+from snake.backend import (
+    Direction, Snake, SnakeGame, DIRECTION_CODES, DIRECTIONS_BY_CODE,
+    replay_game
+)
 
 HELP_BOX_COLUMNS = 30
 CONTROLS_HELP = (
     'Chosen level: {level}.\nControls:\n- (N) new game;\n'
     '- (↑↓→←) move;\n- (Space) pause;\n- (Q) quit.'
 )
+AUTOPILOT_HELP = '\n\nAutopilot planning:'
+PLANNING_ROW = CONTROLS_HELP.count('\n') + AUTOPILOT_HELP.count('\n') + 1
+PLANNING_TIME = '{last:.2f} ms (max {max:.2f} ms)'
+TICK_STATS = (
+    'Tick: {mean:.0f} ms, max {max:.0f}, jitter {jitter:.1f}, {late} late.'
+)
+# Share of the tick the autopilot may spend on planning.
+AUTOPILOT_BUDGET_SHARE = 0.5
+
+# Turns pressed faster than ticks go are applied one per tick, those
+# pressed when this many are waiting are ignored.
+MAX_PENDING_TURNS = 3
+# Shortest tick in seconds, whatever the score
+MIN_TICK_INTERVAL = 0.03
+
+KEY_DIRECTIONS = {
+    curses.KEY_UP: Direction.up,
+    curses.KEY_DOWN: Direction.down,
+    curses.KEY_LEFT: Direction.left,
+    curses.KEY_RIGHT: Direction.right,
+}
 
 
 class Levels(int, Enum):
@@ -17,6 +46,21 @@ class Levels(int, Enum):
     hard = 50
 
 
+# Tick gets shorter by this factor with every apple
+SPEED_CURVES = {
+    Levels.easy: 1.0,
+    Levels.normal: 0.99,
+    Levels.hard: 0.98,
+}
+
+
+def get_tick_interval(level: Levels, score: int) -> float:
+    # Initial speed is the same as when the tick was `level` plus the
+    # length of a new snake in milliseconds.
+    interval = (level + 3) / 1000 * SPEED_CURVES[level] ** score
+    return max(interval, MIN_TICK_INTERVAL)
+
+
 class SnakeMain:
     def get_menu(self):
         change_level_submenu_items = [
@@ -37,7 +81,7 @@ class SnakeMain:
         change_level_submenu = Menu(
             change_level_submenu_items, self.window,
             self.screen_sizes,
-            type_messages=[self._type_level]
+            banners=[self._get_level_message]
         )
         main_menu_items = [
             MenuItem(
@@ -45,37 +89,42 @@ class SnakeMain:
                 MenuItemCallback(self.close_menu),
                 MenuItemCallback(self.start_game)
             ),
+            MenuItem(
+                'Replay',
+                MenuItemCallback(self.close_menu),
+                MenuItemCallback(self.start_replay)
+            ),
             MenuItem('Level', MenuItemCallback(change_level_submenu.display)),
+            MenuItem('Autopilot', MenuItemCallback(self.toggle_autopilot)),
             MenuItem('Exit', MenuItemCallback(lambda: True))
         ]
         return Menu(
             main_menu_items, self.window, self.screen_sizes,
-            type_messages=[self._type_level]
+            banners=[self._get_level_message, self._get_autopilot_message]
         )
 
     def __init__(self, window):
         self.window = window
         self.screen_sizes = self.window.getmaxyx()
         self.level = Levels.easy
-        self.score = 0
-        curses.curs_set(0)
-        curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
-        curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
+        self.autopilot_on = False
+        self.last_replay: Optional[Replay] = None
+        self.window.curs_set(0)
+        self.window.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
+        self.window.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
         self.main_menu = self.get_menu()
 
-    def _type_level(self):
-        self.window.move(self.screen_sizes[0] - 2, 0)
-        self.window.clrtoeol()
-        message = f'Chosen level: {self.level.name}'
-        self.window.addstr(
-            self.screen_sizes[0] - 2,
-            (self.screen_sizes[1] - len(message)) // 2,
-            message, curses.A_BOLD
-        )
+    def _get_level_message(self) -> str:
+        return f'Chosen level: {self.level.name}'
+
+    def toggle_autopilot(self):
+        self.autopilot_on = not self.autopilot_on
+
+    def _get_autopilot_message(self) -> str:
+        return f'Autopilot: {"on" if self.autopilot_on else "off"}'
 
     def set_level(self, **kwargs):
         self.level = kwargs['level']
-        self._type_level()
         return True
 
     def close_menu(self):
@@ -100,21 +149,50 @@ class SnakeMain:
         box.addstr(message)
 
     def type_score_in_box(self, box, message: str):
-        box.move(
-            self.screen_sizes[0] - 3, (HELP_BOX_COLUMNS - len(message)) // 2
+        box.move(self.screen_sizes[0] - 3, 0)
+        box.clrtoeol()
+        box.addstr(
+            self.screen_sizes[0] - 3, (HELP_BOX_COLUMNS - len(message)) // 2,
+            message, curses.A_BOLD
         )
+
+    def type_help_in_box(self, box, level: Levels, autopilot):
+        box.clear()
+        help_text = CONTROLS_HELP.format(level=level.name)
+        if autopilot:
+            help_text += AUTOPILOT_HELP
+        self.type_message_in_box(box, help_text)
+
+    @staticmethod
+    def type_planning_in_box(box, autopilot: Autopilot):
+        box.move(PLANNING_ROW, 0)
         box.clrtoeol()
-        box.refresh()
-        box.addstr(message, curses.A_BOLD)
-        box.refresh()
+        box.addstr(PLANNING_TIME.format(
+            last=autopilot.last_plan_time * 1000,
+            max=autopilot.max_plan_time * 1000,
+        ))
 
     def draw_snake(self, box, snake: Snake):
         for snake_tail in snake.tail:
             box.move(snake_tail.row, snake_tail.column)
-            box.addstr('⧳', curses.color_pair(2))
+            box.addstr('⧳', self.window.color_pair(2))
         box.move(snake.head.row, snake.head.column)
-        box.addstr('◍', curses.color_pair(1))
-        box.refresh()
+        box.addstr('◍', self.window.color_pair(1))
+
+    def draw_step(self, box, game: SnakeGame):
+        """Redraw only the cells changed by the last step of `game`."""
+        if game.vacated:
+            box.addstr(game.vacated.row, game.vacated.column, ' ')
+        coordinates = game.snake.snake_coordinates
+        if len(coordinates) > 1:
+            box.addstr(
+                coordinates[1].row, coordinates[1].column, '⧳',
+                self.window.color_pair(2)
+            )
+        box.addstr(
+            coordinates[0].row, coordinates[0].column, '◍',
+            self.window.color_pair(1)
+        )
 
     def draw_apples(self, box, apples: list):
         for apple in apples:
@@ -122,19 +200,51 @@ class SnakeMain:
                 box.move(apple.row, apple.column)
             except Exception as e:
                 assert False, (apple.row, apple.column, e)
-            box.addstr('◍', curses.color_pair(1) | curses.A_BOLD)
-        box.refresh()
+            box.addstr('◍', self.window.color_pair(1) | curses.A_BOLD)
+
+    def start_replay(self):
+        if self.last_replay:
+            self.start_game(self.last_replay)
+        else:
+            self.main_menu.display()
+
+    def _record(self, game: SnakeGame) -> Replay:
+        self.last_replay = Replay(GameKind.snake, game.seed, (
+            game.init_row, game.init_column, game.end_row, game.end_column,
+            self.level
+        ))
+        return self.last_replay
+
+    def check_replay(self, replay: Replay):
+        """Raise ValueError if the board of `replay` does not fit the screen."""
+        end_row, end_column = replay.params[2:4]
+        if (
+            end_row > self.screen_sizes[0]
+            or end_column + HELP_BOX_COLUMNS > self.screen_sizes[1]
+        ):
+            raise ValueError(
+                f'Replay needs a terminal of {end_row} x '
+                f'{end_column + HELP_BOX_COLUMNS}, this one is '
+                f'{self.screen_sizes[0]} x {self.screen_sizes[1]}'
+            )
 
-    def start_game(self):
+    def start_game(self, replay: Optional[Replay] = None, start_tick: int = 0):
+        """
+        Play a new game, or show `replay` from `start_tick` if given: ticks
+        before it are re-simulated without drawing. Replays are shown on
+        the board size they were recorded on.
+        """
         init_row = 0
         init_column = 0
-        board_rows = self.screen_sizes[0]
-        board_columns = self.screen_sizes[1] - HELP_BOX_COLUMNS
+        if replay:
+            self.check_replay(replay)
+            board_rows, board_columns = replay.params[2:4]
+        else:
+            board_rows = self.screen_sizes[0]
+            board_columns = self.screen_sizes[1] - HELP_BOX_COLUMNS
 
         board_box = self.window.subwin(
-            self.screen_sizes[0],
-            self.screen_sizes[1] - HELP_BOX_COLUMNS,
-            init_row, init_column
+            board_rows, board_columns, init_row, init_column
         )
         board_box.box()
         help_box, help_box_wrapper = self._get_and_draw_textbox(
@@ -142,118 +252,133 @@ class SnakeMain:
         )
         help_box.clear()
 
-        snake = Snake(init_row, init_column, board_rows, board_columns)
+        if replay:
+            game = replay_game(replay, start_tick)
+            level = Levels(replay.params[4])
+            actions = {tick: code for tick, code in replay.events}
+        else:
+            game = SnakeGame(init_row, init_column, board_rows, board_columns)
+            level = self.level
+            recording = self._record(game)
+        snake = game.snake
+        clock = GameClock(board_box, get_tick_interval(level, game.score))
+        autopilot = not replay and self.autopilot_on and Autopilot(
+            game, clock.interval * AUTOPILOT_BUDGET_SHARE
+        )
 
         self.draw_snake(board_box, snake)
         self.draw_apples(board_box, snake.apples)
+        board_box.refresh()
+        self.type_help_in_box(help_box, level, autopilot)
+        self.type_score_in_box(help_box, f'Score: {game.score}')
+        help_box.refresh()
 
         board_box.keypad(1)
-        key = curses.KEY_RIGHT
-        failed = False
-        board_box.timeout(self.level + len(snake.snake_coordinates))
-        while not failed:
-            help_box.clear()
-            self.type_message_in_box(
-                help_box, CONTROLS_HELP.format(level=self.level.name)
-            )
-            self.type_score_in_box(help_box, f'Score: {self.score}')
-            previous_key = key
-            event = board_box.getch()
-            if event != -1:
-                key = event
-
-            if key == ord('q'):
-                break
-            elif key == ord('n'):
-                key = curses.KEY_RIGHT
-                board_box.clear()
-                board_box.box()
-                board_box.refresh()
-                help_box.clear()
-                snake = Snake(
-                    init_row, init_column, board_rows, board_columns
-                )
-                self.score = 0
-                self.draw_snake(board_box, snake)
-            elif key == ord(' '):
-                key = None
-                while key != ord(' '):
+        turns: deque = deque()
+        finished = quit_game = False
+        while not finished and not quit_game:
+            for key in clock.wait():
+                if key == ord('q'):
+                    quit_game = True
+                elif key == ord('n') and not replay:
+                    self.window.save_replay(recording)
+                    board_box.clear()
+                    board_box.box()
+                    snake = game.reset()
+                    recording = self._record(game)
+                    autopilot = autopilot and Autopilot(
+                        game, autopilot.budget
+                    )
+                    turns.clear()
+                    clock.interval = get_tick_interval(level, game.score)
+                    self.draw_snake(board_box, snake)
+                    self.draw_apples(board_box, snake.apples)
+                    board_box.refresh()
+                    self.type_score_in_box(help_box, f'Score: {game.score}')
+                    help_box.refresh()
+                elif key == ord(' '):
                     help_box.clear()
                     self.type_message_in_box(
                         help_box, 'Paused. Press space to continue.'
                     )
-                    key = self.window.getch()
-                key = previous_key
-            elif key not in (
-                curses.KEY_DOWN,
-                curses.KEY_UP,
-                curses.KEY_RIGHT,
-                curses.KEY_LEFT,
-            ):
-                key = previous_key
-            elif (
-                previous_key == curses.KEY_DOWN and key == curses.KEY_UP
-                or previous_key == curses.KEY_UP and key == curses.KEY_DOWN
-                or previous_key == curses.KEY_LEFT and key == curses.KEY_RIGHT
-                or previous_key == curses.KEY_RIGHT and key == curses.KEY_LEFT
-            ):
-                key = previous_key
+                    help_box.refresh()
+                    while self.window.getch() != ord(' '):
+                        pass
+                    self.type_help_in_box(help_box, level, autopilot)
+                    self.type_score_in_box(help_box, f'Score: {game.score}')
+                    help_box.refresh()
+                    clock.reset()
+                elif key in KEY_DIRECTIONS:
+                    turn = KEY_DIRECTIONS[key]
+                    if len(turns) < MAX_PENDING_TURNS and turn != (
+                        turns[-1] if turns else game.direction
+                    ):
+                        turns.append(turn)
+            if quit_game:
+                break
+
+            if replay:
+                code = actions.get(game.ticks)
+                action = None if code is None else DIRECTIONS_BY_CODE[code]
+            elif autopilot:
+                action = autopilot.choose()
             else:
-                new_row = (
-                    snake.head.row
-                    + (key == curses.KEY_DOWN and 1)
-                    + (key == curses.KEY_UP and -1)
-                )
-                new_column = (
-                    snake.head.column
-                    + (key == curses.KEY_RIGHT and 1)
-                    + (key == curses.KEY_LEFT and -1)
-                )
-                snake.snake_coordinates.insert(
-                    0, Coordinates(row=new_row, column=new_column)
-                )
-
-                if (
-                    snake.is_stuck_in_borders(board_rows, board_columns)
-                    or snake.is_stuck_with_self()
-                ):
-                    failed = True
-                elif snake.head in snake.apples:
-                    curses.beep()
-                    self.score += 1
-                    snake.apples.remove(snake.head)
-                    snake.apples.append(snake.generate_apple())
-                    self.draw_apples(board_box, snake.apples)
-                else:
-                    tail_end = snake.snake_coordinates.pop()
-                    board_box.addstr(tail_end.row, tail_end.column, ' ')
-                self.draw_snake(board_box, snake)
+                action = turns.popleft() if turns else None
+            direction = game.direction
+            snake, reward, done = game.step(action)
+            if not replay:
+                if game.direction != direction:
+                    recording.record(
+                        game.ticks - 1, DIRECTION_CODES[game.direction]
+                    )
+                recording.ticks = game.ticks
+            if not done:
+                self.draw_step(board_box, game)
+            if reward > 0:
+                self.window.beep()
+                self.draw_apples(board_box, snake.apples)
+                self.type_score_in_box(help_box, f'Score: {game.score}')
+                clock.interval = get_tick_interval(level, game.score)
+                if autopilot:
+                    autopilot.budget = clock.interval * AUTOPILOT_BUDGET_SHARE
+            if autopilot:
+                self.type_planning_in_box(help_box, autopilot)
+            # All changes of the tick go to the terminal at once
+            board_box.noutrefresh()
+            help_box.noutrefresh()
+            self.window.doupdate()
 
-            if failed:
+            finished = game.done or replay and game.ticks >= replay.ticks
+            if finished:
+                board_box.timeout(-1)
                 board_box.clear()
                 board_box.refresh()
                 help_box_wrapper.clear()
                 help_box_wrapper.refresh()
-                board_box.addstr(
-                    self.screen_sizes[0] // 2,
-                    self.screen_sizes[1] // 2 - 4,
-                    'YOU LOST!'
-                )
-                board_box.addstr(
-                    self.screen_sizes[0] // 2 + 1,
-                    self.screen_sizes[1] // 2 - 8,
-                    f'Your score is: {self.score}.'
-                )
-                board_box.addstr(
-                    self.screen_sizes[0] // 2 + 2,
-                    self.screen_sizes[1] // 2 - 6,
-                    '[Press Enter]'
-                )
-                self.score = 0
+                stats = clock.stats()
+                lines = [
+                    'YOU WON!' if game.won
+                    else 'YOU LOST!' if game.done else 'END OF REPLAY',
+                    f'Your score is: {game.score}.',
+                    TICK_STATS.format(
+                        mean=stats['mean_frame_time'] * 1000,
+                        max=stats['max_frame_time'] * 1000,
+                        jitter=stats['jitter'] * 1000,
+                        late=stats['late_ticks'],
+                    ),
+                    '[Press Enter]',
+                ]
+                # Centred on the board, which is smaller than the screen
+                # for replays recorded on a smaller one.
+                for row, line in enumerate(lines, board_rows // 2):
+                    board_box.addstr(
+                        row, (board_columns - len(line)) // 2, line
+                    )
                 while True:
                     key = board_box.getch()
                     if key in [curses.KEY_ENTER, ord('\n')]:
                         break
 
+        if not replay:
+            self.window.save_replay(recording)
         self.main_menu.display()
-
@@ -1,6 +1,9 @@
 import copy
 import random
-from typing import NamedTuple
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
+
+from sudoku.parallel import Board, search, solve_parallel
 
 
 class ItemCoordinate(NamedTuple):
@@ -36,6 +39,13 @@ ITEM_COORD_TO_BOARD_MAPPER = __create_mapper_inner_coordinates_to_board()
 DEFAULT_POINTER_POSITION = ItemCoordinate(row=0, column=0)
 
 
+class Levels(int, Enum):
+    # Given cells `populate` stops removing at
+    easy = 36
+    normal = 18
+    hard = 9
+
+
 class Block:
     # negative values mean preset default values
     def __init__(self):
@@ -63,8 +73,11 @@ class Sudoku:
 
     def __init__(self):
         self.blocks = [Block() for _ in range(9)]
-        self.virtual_sudoku = copy.deepcopy(self)
-        self.cached_sudoku = copy.deepcopy(self)
+        # Seed it to get the same board from `populate`, e.g. in replays
+        self.random = random.Random()
+        # Solved and initial copies of the board, made by `populate`
+        self.virtual_sudoku = None
+        self.cached_sudoku = None
 
     def clear(self):
         for block in self.blocks:
@@ -87,8 +100,9 @@ class Sudoku:
         # Cached values used in solve() and populate()
         coordinates = list(ITEM_COORD_TO_BOARD_MAPPER.keys())
         # Randomize the list of points and values
-        random.shuffle(coordinates)
-        random.shuffle(self.allowed_values)
+        self.random.shuffle(coordinates)
+        self.allowed_values = list(range(1, 10))
+        self.random.shuffle(self.allowed_values)
         self.clear()
         self.solve()
 
@@ -100,7 +114,7 @@ class Sudoku:
                 if new_value == current_value:
                     continue
                 self[coordinate] = new_value
-                if self.solve(True):
+                if self.has_solution():
                     self[coordinate] = current_value
                     break
             else:
@@ -115,6 +129,9 @@ class Sudoku:
         for coordinate in coordinates:
             self[coordinate] *= -1
 
+        # Drop copies of the previous board, so that they are not copied
+        # into the new ones.
+        self.virtual_sudoku = self.cached_sudoku = None
         self.virtual_sudoku = copy.deepcopy(self)
         self.cached_sudoku = copy.deepcopy(self)
         self.virtual_sudoku.solve()
@@ -164,19 +181,97 @@ class Sudoku:
     def fill_cell(self, item_coordinates: ItemCoordinate):
         self[item_coordinates] = self.virtual_sudoku[item_coordinates]
 
-    def solve(self, check=False):
-        if self.is_solved():
-            return True
+    def to_string(self) -> str:
+        """81 digits row by row, `0` for empty cells."""
+        return ''.join(
+            str(abs(self[ItemCoordinate(row=row, column=column)]))
+            for row in range(9)
+            for column in range(9)
+        )
 
-        item_coordinate = None
+    @classmethod
+    def from_string(cls, puzzle: str) -> 'Sudoku':
+        """
+        Board from `to_string` output, `.` is accepted for empty cells.
+        Digits become pre-defined values.
+        """
+        if len(puzzle) != 81:
+            raise ValueError(f'Expected 81 cells, got {len(puzzle)}')
+        sudoku = cls()
+        for index, char in enumerate(puzzle):
+            if char in '.0':
+                continue
+            if char not in '123456789':
+                raise ValueError(f'Not a digit: {char}')
+            sudoku[ItemCoordinate(row=index // 9, column=index % 9)] = (
+                -int(char)
+            )
+        return sudoku
+
+    def find_empty(self) -> Optional[ItemCoordinate]:
         for column in range(9):
-            if item_coordinate is not None:
-                break
             for row in range(9):
                 if self[ItemCoordinate(column=column, row=row)] == 0:
-                    item_coordinate = ItemCoordinate(column=column, row=row)
-                    break
+                    return ItemCoordinate(column=column, row=row)
+        return None
+
+    def has_solution(self) -> bool:
+        """
+        Same as `solve(check=True)`, but with the search of
+        `sudoku.parallel`, which does not stall on boards `solve` does.
+        """
+        solutions: List[List[int]] = []
+
+        def on_solution(cells: List[int]) -> bool:
+            solutions.append(cells)
+            return True
 
+        search(Board([int(char) for char in self.to_string()]), on_solution)
+        return bool(solutions)
+
+    def _solve_parallel(self, limit: int) -> list:
+        cells = [int(char) for char in self.to_string()]
+        return solve_parallel(cells, limit=limit).solutions
+
+    def count_solutions(self, limit: int = 2, parallel: bool = False) -> int:
+        """
+        Number of solutions, counting stops at `limit`: the default tells
+        if the solution is unique. The board is left as it was.
+        """
+        if parallel:
+            return len(self._solve_parallel(limit))
+        item_coordinate = self.find_empty()
+        if item_coordinate is None:
+            return 1
+
+        count = 0
+        for value in self.allowed_values:
+            try:
+                self[item_coordinate] = value
+            except ValueError:
+                continue
+            count += self.count_solutions(limit - count)
+            self[item_coordinate] = 0
+            if count >= limit:
+                break
+        return count
+
+    def solve(self, check=False, parallel=False):
+        if self.is_solved():
+            return True
+        if parallel:
+            # Split between processes, see `sudoku.parallel`
+            solutions = self._solve_parallel(1)
+            if solutions and not check:
+                for index, value in enumerate(solutions[0]):
+                    item_coordinate = ItemCoordinate(
+                        row=index // 9, column=index % 9
+                    )
+                    if self[item_coordinate] == 0:
+                        self[item_coordinate] = value
+            return bool(solutions)
+
+        item_coordinate = self.find_empty()
         if item_coordinate is None:
             return True
 
@@ -192,3 +287,14 @@ class Sudoku:
                     return True
                 else:
                     self[item_coordinate] = 0
+
+
+# Module level, so that they can be sent to a process pool, see
+# `CursesScreen.offload`. Boards come back with their `random` advanced.
+def populate_board(sudoku: Sudoku, n: int) -> Sudoku:
+    sudoku.populate(n)
+    return sudoku
+
+
+def solve_board(sudoku: Sudoku) -> Tuple[Sudoku, bool]:
+    return sudoku, bool(sudoku.solve())
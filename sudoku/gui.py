@@ -1,11 +1,14 @@
 import copy
 import curses
-from enum import Enum
+import random
+from typing import Optional
 
 from menu import MenuItem, MenuItemCallback, Menu
+from replay import GameKind, PlaybackScreen, Replay
+from screen import KeysExhausted, VirtualScreen
 from sudoku.backend import (
-    ItemCoordinate, Sudoku, DEFAULT_POINTER_POSITION,
-    ITEM_COORD_TO_BOARD_MAPPER
+    ItemCoordinate, Levels, Sudoku, DEFAULT_POINTER_POSITION,
+    ITEM_COORD_TO_BOARD_MAPPER, populate_board, solve_board
 )
 
 # Should not be changed or board will become ugly
@@ -24,12 +27,8 @@ CONTROLS_HELP = (
 USER_HINTS_HELP = (
     '\nHints:\n- (H) fill in the cell.'
 )
-
-
-class Levels(int, Enum):
-    easy = 36
-    normal = 18
-    hard = 9
+# Replays store the time of each key press in these units
+REPLAY_TICK_SECONDS = 0.01
 
 
 class SudokuMain:
@@ -52,7 +51,7 @@ class SudokuMain:
         change_level_submenu = Menu(
             change_level_submenu_items, self.window,
             self.screen_sizes,
-            type_messages=[self._type_level, self._type_hints]
+            banners=[self._get_level_message, self._get_hints_message]
         )
         main_menu_items = [
             MenuItem(
@@ -60,6 +59,11 @@ class SudokuMain:
                 MenuItemCallback(self.close_menu),
                 MenuItemCallback(self.start_game)
             ),
+            MenuItem(
+                'Replay',
+                MenuItemCallback(self.close_menu),
+                MenuItemCallback(self.start_replay)
+            ),
             MenuItem('Level', MenuItemCallback(change_level_submenu.display)),
             MenuItem('Hints', MenuItemCallback(self.toggle_hints)),
             # Uncomment below for cheating
@@ -68,7 +72,7 @@ class SudokuMain:
         ]
         return Menu(
             main_menu_items, self.window, self.screen_sizes,
-            type_messages=[self._type_level, self._type_hints]
+            banners=[self._get_level_message, self._get_hints_message]
         )
 
     def __init__(self, window):
@@ -77,41 +81,26 @@ class SudokuMain:
         self.level = Levels.easy
         self.hints_on = False
         self.dev_hints_on = False
-        curses.curs_set(0)
+        self.window.curs_set(0)
         self.main_menu = self.get_menu()
         self.sudoku = Sudoku()
         self.cached_sudoku = None
+        self.last_replay: Optional[Replay] = None
 
     def toggle_dev_hints(self):
         self.dev_hints_on = not self.hints_on
 
     def toggle_hints(self):
         self.hints_on = not self.hints_on
-        self._type_hints()
 
-    def _type_hints(self):
-        self.window.move(self.screen_sizes[0] - 3, 0)
-        self.window.clrtoeol()
-        message = f'Hints: {"on" if self.hints_on else "off"}'
-        self.window.addstr(
-            self.screen_sizes[0] - 3,
-            (self.screen_sizes[1] - len(message)) // 2,
-            message, curses.A_BOLD
-        )
+    def _get_hints_message(self) -> str:
+        return f'Hints: {"on" if self.hints_on else "off"}'
 
-    def _type_level(self):
-        self.window.move(self.screen_sizes[0] - 2, 0)
-        self.window.clrtoeol()
-        message = f'Chosen level: {self.level.name}'
-        self.window.addstr(
-            self.screen_sizes[0] - 2,
-            (self.screen_sizes[1] - len(message)) // 2,
-            message, curses.A_BOLD
-        )
+    def _get_level_message(self) -> str:
+        return f'Chosen level: {self.level.name}'
 
     def set_level(self, **kwargs):
         self.level = kwargs['level']
-        self._type_level()
         return True
 
     def close_menu(self):
@@ -165,23 +154,24 @@ class SudokuMain:
         last_column = BOARD_COLUMNS - 1
         second_column = last_column // 3
         third_column = last_column // 3 * 2
+        acs = self.window.acs
         # Can not use nested boxes here because it's ugly
-        board_box.vline(0, second_column, curses.ACS_VLINE, BOARD_ROWS)
-        board_box.vline(0, third_column, curses.ACS_VLINE, BOARD_ROWS)
-        board_box.hline(second_row, 0, curses.ACS_HLINE, BOARD_COLUMNS)
-        board_box.hline(third_row, 0, curses.ACS_HLINE, BOARD_COLUMNS)
-        board_box.addch(0, second_column, curses.ACS_TTEE)
-        board_box.addch(0, third_column, curses.ACS_TTEE)
-        board_box.addch(last_row, second_column, curses.ACS_BTEE)
-        board_box.addch(last_row, third_column, curses.ACS_BTEE)
-        board_box.addch(second_row, 0, curses.ACS_LTEE)
-        board_box.addch(third_row, 0, curses.ACS_LTEE)
-        board_box.addch(second_row, last_column, curses.ACS_RTEE)
-        board_box.addch(third_row, last_column, curses.ACS_RTEE)
-        board_box.addch(second_row, second_column, curses.ACS_PLUS)
-        board_box.addch(second_row, third_column, curses.ACS_PLUS)
-        board_box.addch(third_row, second_column, curses.ACS_PLUS)
-        board_box.addch(third_row, third_column, curses.ACS_PLUS)
+        board_box.vline(0, second_column, acs('VLINE'), BOARD_ROWS)
+        board_box.vline(0, third_column, acs('VLINE'), BOARD_ROWS)
+        board_box.hline(second_row, 0, acs('HLINE'), BOARD_COLUMNS)
+        board_box.hline(third_row, 0, acs('HLINE'), BOARD_COLUMNS)
+        board_box.addch(0, second_column, acs('TTEE'))
+        board_box.addch(0, third_column, acs('TTEE'))
+        board_box.addch(last_row, second_column, acs('BTEE'))
+        board_box.addch(last_row, third_column, acs('BTEE'))
+        board_box.addch(second_row, 0, acs('LTEE'))
+        board_box.addch(third_row, 0, acs('LTEE'))
+        board_box.addch(second_row, last_column, acs('RTEE'))
+        board_box.addch(third_row, last_column, acs('RTEE'))
+        board_box.addch(second_row, second_column, acs('PLUS'))
+        board_box.addch(second_row, third_column, acs('PLUS'))
+        board_box.addch(third_row, second_column, acs('PLUS'))
+        board_box.addch(third_row, third_column, acs('PLUS'))
         board_box.refresh()
 
     def draw_items(
@@ -218,7 +208,42 @@ class SudokuMain:
 
                 board_box.refresh()
 
-    def start_game(self):
+    def populate(self):
+        # May run in another process, which returns a new board
+        self.sudoku = self.window.offload(
+            populate_board, self.sudoku, self.level.value
+        )
+
+    def start_replay(self):
+        if self.last_replay:
+            self.start_game(self.last_replay)
+        else:
+            self.main_menu.display()
+
+    def start_game(self, replay: Optional[Replay] = None, start_tick: int = 0):
+        """
+        Play a new game, or replay the keys of `replay` with their timing
+        from `start_tick`, keys before it are applied at once.
+        """
+        settings = self.level, self.hints_on, self.dev_hints_on
+        if replay:
+            level, hints_on, dev_hints_on = replay.params
+            self.level = Levels(level)
+            self.hints_on = bool(hints_on)
+            self.dev_hints_on = bool(dev_hints_on)
+            keys = PlaybackScreen(
+                self.window, replay, start_tick, REPLAY_TICK_SECONDS
+            )
+        else:
+            replay = recording = Replay(
+                GameKind.sudoku, random.randrange(2 ** 32),
+                (self.level, self.hints_on, self.dev_hints_on)
+            )
+            self.last_replay = recording
+            keys = self.window
+        self.sudoku.random.seed(replay.seed)
+        started = self.window.monotonic()
+
         self.window.border(0)
         self.window.refresh()
         init_row = (self.screen_sizes[0] - BOARD_ROWS) // 2
@@ -247,7 +272,7 @@ class SudokuMain:
         self.type_message_in_box(
             message_box, 'Started generating new board...'
         )
-        self.sudoku.populate(self.level.value)
+        self.populate()
         self.cached_sudoku = copy.deepcopy(self.sudoku)
         self.draw_items(board_box, pointer, self.dev_hints_on)
         self.type_message_in_box(
@@ -257,7 +282,12 @@ class SudokuMain:
             is_solved = self.sudoku.is_solved()
             if is_solved:
                 self.type_message_in_box(message_box, 'Solved sudoku!')
-            key = chr(self.window.getch())
+            code = keys.getch()
+            if keys is self.window:
+                recording.record(round(
+                    (self.window.monotonic() - started) / REPLAY_TICK_SECONDS
+                ), code)
+            key = chr(code)
             if key == 'q':
                 break
             elif not is_solved and self.dev_hints_on and key == 'c':
@@ -273,7 +303,10 @@ class SudokuMain:
                     )
             elif not is_solved and self.dev_hints_on and key == 's':
                 self.type_message_in_box(message_box, 'Started solving...')
-                if not self.sudoku.solve():
+                self.sudoku, solved = self.window.offload(
+                    solve_board, self.sudoku
+                )
+                if not solved:
                     self.type_message_in_box(message_box, 'Could not solve.')
                 self.draw_items(
                     board_box,
@@ -287,7 +320,7 @@ class SudokuMain:
                 self.sudoku.clear()
                 self.draw_items(board_box, pointer, self.dev_hints_on)
 
-                self.sudoku.populate(self.level.value)
+                self.populate()
                 self.cached_sudoku = copy.deepcopy(self.sudoku)
                 self.draw_items(board_box, pointer, self.dev_hints_on)
 
@@ -358,4 +391,24 @@ class SudokuMain:
                 self.window.refresh()
 
             self.window.refresh()
+        if keys is self.window:
+            self.window.save_replay(recording)
+        self.level, self.hints_on, self.dev_hints_on = settings
         self.main_menu.display()
+
+
+def replay_board(replay: Replay, ticks: Optional[int] = None) -> Sudoku:
+    """
+    Re-run a recorded session up to `ticks` without a terminal and return
+    the board as it was at that moment.
+    """
+    truncated = Replay(replay.kind, replay.seed, replay.params)
+    for tick, code in replay.events:
+        if ticks is None or tick < ticks:
+            truncated.record(tick, code)
+    main = SudokuMain(VirtualScreen())
+    try:
+        main.start_game(truncated, start_tick=truncated.ticks)
+    except KeysExhausted:
+        pass
+    return main.sudoku
@@ -0,0 +1,378 @@
+"""
+Parallel search for hard puzzles and boards larger than 9 x 9.
+
+Boards are flat lists of `size * size` values row by row, `size` being
+`box * box` (3 for the usual board, 4 for 16 x 16 and so on), 0 for
+empty cells. The search tree is split at its top branching cells into
+subproblems that worker processes take from a shared queue. A worker that
+sees others waiting donates the untried branches closest to the root of
+its own search, so the load stays balanced without a long split up front.
+
+Run `python -m sudoku.parallel [PUZZLE]` to time a solve.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Workers look at the cancel flag and at idle workers once per this many
+# nodes of the search.
+CHECK_INTERVAL = 256
+# Subproblems made before starting workers, per worker
+SPLIT_FACTOR = 4
+POLL_SECONDS = 0.01
+# Values in puzzle strings, enough for 25 x 25 boards
+DIGITS = '123456789ABCDEFGHIJKLMNOP'
+# 'AI Escargot', one of the hardest known 9 x 9 puzzles
+HARD_PUZZLE = (
+    '100007090030020008009600500005300900010080002600004000300000010'
+    '040000007007000300'
+)
+
+
+@lru_cache(maxsize=8)
+def get_units(box: int) -> Tuple[Tuple[int, int, int], ...]:
+    """Row, column and box of every cell."""
+    size = box * box
+    return tuple(
+        (row, column, row // box * box + column // box)
+        for row in range(size)
+        for column in range(size)
+    )
+
+
+class Board:
+    """Cells with bitmasks of the values used in every row, column, box."""
+
+    def __init__(self, cells: Sequence[int], box: int = 3):
+        self.box = box
+        self.size = box * box
+        if len(cells) != self.size ** 2:
+            raise ValueError(
+                f'Expected {self.size ** 2} cells, got {len(cells)}'
+            )
+        # Bit `value - 1` stands for `value`
+        self.full = (1 << self.size) - 1
+        self.units = get_units(box)
+        self.rows = [0] * self.size
+        self.columns = [0] * self.size
+        self.boxes = [0] * self.size
+        self.cells = [0] * len(cells)
+        for cell, value in enumerate(cells):
+            if not 0 <= value <= self.size:
+                raise ValueError(f'Value out of range: {value}')
+            if value and not self.candidates(cell) & 1 << value - 1:
+                raise ValueError(f'Value {value} conflicts at cell {cell}')
+            if value:
+                self.place(cell, 1 << value - 1)
+
+    def candidates(self, cell: int) -> int:
+        row, column, box = self.units[cell]
+        return self.full & ~(
+            self.rows[row] | self.columns[column] | self.boxes[box]
+        )
+
+    def place(self, cell: int, bit: int):
+        row, column, box = self.units[cell]
+        self.rows[row] |= bit
+        self.columns[column] |= bit
+        self.boxes[box] |= bit
+        self.cells[cell] = bit.bit_length()
+
+    def remove(self, cell: int):
+        bit = ~(1 << self.cells[cell] - 1)
+        row, column, box = self.units[cell]
+        self.rows[row] &= bit
+        self.columns[column] &= bit
+        self.boxes[box] &= bit
+        self.cells[cell] = 0
+
+    def choose(self) -> Optional[Tuple[int, int]]:
+        """
+        Empty cell with the fewest candidates and their mask, None if the
+        board is full. A mask of 0 means a dead end.
+        """
+        best = None
+        best_count = self.size + 1
+        for cell, value in enumerate(self.cells):
+            if value:
+                continue
+            mask = self.candidates(cell)
+            count = bin(mask).count('1')
+            if count < best_count:
+                best, best_count = (cell, mask), count
+                if count <= 1:
+                    break
+        return best
+
+
+def search(
+    board: Board, on_solution: Callable[[List[int]], bool],
+    check: Optional[Callable[[Board, list], bool]] = None
+) -> int:
+    """
+    Depth first search from `board`, returns the number of nodes visited.
+
+    The stack holds `[cell, untried values mask]` per level, so that
+    `check`, called every `CHECK_INTERVAL` nodes, can take untried
+    branches away. Both callbacks stop the search by returning True.
+    """
+    choice = board.choose()
+    if choice is None:
+        on_solution(list(board.cells))
+        return 0
+    stack = [list(choice)]
+    nodes = 0
+    while stack:
+        frame = stack[-1]
+        cell, untried = frame
+        if board.cells[cell]:
+            board.remove(cell)
+        if not untried:
+            stack.pop()
+            continue
+        bit = untried & -untried
+        frame[1] = untried ^ bit
+        board.place(cell, bit)
+        nodes += 1
+        if check and nodes % CHECK_INTERVAL == 0 and check(board, stack):
+            break
+        choice = board.choose()
+        if choice is None:
+            if on_solution(list(board.cells)):
+                break
+        elif choice[1]:
+            stack.append(list(choice))
+    return nodes
+
+
+def split(board: Board, count: int) -> Tuple[list, list, int]:
+    """
+    Branch breadth first at the top cells until there are `count`
+    subproblems. Returns them, solutions met on the way and node count.
+    """
+    frontier = deque([list(board.cells)])
+    solutions = []
+    nodes = 0
+    while frontier and len(frontier) < count:
+        cells = frontier.popleft()
+        choice = Board(cells, board.box).choose()
+        if choice is None:
+            solutions.append(cells)
+            continue
+        cell, mask = choice
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            child = cells.copy()
+            child[cell] = bit.bit_length()
+            frontier.append(child)
+            nodes += 1
+    return list(frontier), solutions, nodes
+
+
+def donate(board: Board, stack: list) -> List[List[int]]:
+    """Take the untried branches of the shallowest level off `stack`."""
+    for depth, (cell, untried) in enumerate(stack):
+        if untried:
+            break
+    else:
+        return []
+    base = list(board.cells)
+    for deeper_cell, _ in stack[depth + 1:]:
+        base[deeper_cell] = 0
+    subproblems = []
+    while untried:
+        bit = untried & -untried
+        untried ^= bit
+        subproblem = base.copy()
+        subproblem[cell] = bit.bit_length()
+        subproblems.append(subproblem)
+    stack[depth][1] = 0
+    return subproblems
+
+
+def work(box, limit, tasks, results, cancel, pending, waiting):
+    """Worker process: search subproblems until none are left."""
+    nodes = donations = found = 0
+
+    def on_solution(cells: List[int]) -> bool:
+        nonlocal found
+        found += 1
+        results.put(('solution', cells))
+        return found >= limit or cancel.is_set()
+
+    def check(board: Board, stack: list) -> bool:
+        nonlocal donations
+        if cancel.is_set():
+            return True
+        if waiting.value > 0:
+            for subproblem in donate(board, stack):
+                # Counted before it is queued, so that `pending` never
+                # drops to 0 while there is work left.
+                with pending.get_lock():
+                    pending.value += 1
+                tasks.put(subproblem)
+                donations += 1
+        return False
+
+    idle = False
+    while not cancel.is_set():
+        if not idle:
+            with waiting.get_lock():
+                waiting.value += 1
+            idle = True
+        try:
+            cells = tasks.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if pending.value == 0:
+                break
+            continue
+        with waiting.get_lock():
+            waiting.value -= 1
+        idle = False
+        nodes += search(Board(cells, box), on_solution, check)
+        with pending.get_lock():
+            pending.value -= 1
+    if idle:
+        with waiting.get_lock():
+            waiting.value -= 1
+    if cancel.is_set():
+        # Donations nobody will take must not keep the process alive
+        tasks.cancel_join_thread()
+    results.put(('done', nodes, donations))
+
+
+def drain(tasks):
+    while True:
+        try:
+            tasks.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            return
+
+
+class ParallelResult(NamedTuple):
+    solutions: List[List[int]]
+    nodes: int
+    subproblems: int
+    donations: int
+    seconds: float
+
+
+def solve_parallel(
+    cells: Sequence[int], box: int = 3, limit: int = 1,
+    workers: Optional[int] = None
+) -> ParallelResult:
+    """
+    Find up to `limit` solutions, e.g. 2 to check that there is only one.
+    All workers are stopped as soon as `limit` solutions are found.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    board = Board(cells, box)
+
+    solutions = []
+    if workers == 1:
+        def on_solution(solution: List[int]) -> bool:
+            solutions.append(solution)
+            return len(solutions) >= limit
+
+        nodes = search(board, on_solution)
+        return ParallelResult(
+            solutions, nodes, 1, 0, time.perf_counter() - started
+        )
+
+    subproblems, solutions, nodes = split(board, workers * SPLIT_FACTOR)
+    donations = 0
+    if subproblems and len(solutions) < limit:
+        context = multiprocessing.get_context()
+        tasks = context.Queue()
+        results = context.Queue()
+        cancel = context.Event()
+        pending = context.Value('i', len(subproblems))
+        waiting = context.Value('i', 0)
+        for subproblem in subproblems:
+            tasks.put(subproblem)
+        processes = [
+            context.Process(target=work, args=(
+                box, limit - len(solutions), tasks, results, cancel,
+                pending, waiting
+            ), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        done = 0
+        while done < workers:
+            kind, *data = results.get()
+            if kind == 'solution':
+                solutions.append(data[0])
+                if len(solutions) >= limit:
+                    cancel.set()
+            else:
+                done += 1
+                nodes += data[0]
+                donations += data[1]
+        # Subproblems left after a cancel would keep the threads feeding
+        # them to the pipe, and so the processes that queued them, from
+        # ever finishing.
+        drain(tasks)
+        for process in processes:
+            process.join()
+        tasks.cancel_join_thread()
+        tasks.close()
+    return ParallelResult(
+        solutions[:limit], nodes, len(subproblems), donations,
+        time.perf_counter() - started
+    )
+
+
+def from_string(puzzle: str) -> Tuple[List[int], int]:
+    """Cells and box size of a puzzle written with `DIGITS`, `0`/`.`."""
+    box = round(len(puzzle) ** 0.25)
+    if box ** 4 != len(puzzle) or box * box > len(DIGITS):
+        raise ValueError(f'Not a square board: {len(puzzle)} cells')
+    cells = []
+    for char in puzzle.upper():
+        if char in '.0':
+            cells.append(0)
+        elif char in DIGITS[:box * box]:
+            cells.append(DIGITS.index(char) + 1)
+        else:
+            raise ValueError(f'Not a value: {char}')
+    return cells, box
+
+
+def to_string(cells: Sequence[int]) -> str:
+    return ''.join(DIGITS[value - 1] if value else '0' for value in cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time a parallel solve.')
+    parser.add_argument('puzzle', nargs='?', default=HARD_PUZZLE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument(
+        '--unique', action='store_true',
+        help='look for a second solution too'
+    )
+    args = parser.parse_args()
+
+    cells, box = from_string(args.puzzle)
+    result = solve_parallel(cells, box, 2 if args.unique else 1, args.workers)
+    for solution in result.solutions:
+        print(to_string(solution))
+    if args.unique:
+        print('Unique' if len(result.solutions) == 1 else 'Not unique')
+    print(
+        f'{result.seconds * 1000:.1f} ms on {args.workers} workers, '
+        f'{result.nodes} nodes, {result.subproblems} subproblems, '
+        f'{result.donations} donated'
+    )
+
+
+if __name__ == '__main__':
+    main()
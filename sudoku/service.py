@@ -0,0 +1,434 @@
+"""
+JSON lines service sharing one warm pool of sudoku solvers.
+
+Every line sent is a request, `{"id": 1, "method": "solve", ...}`, and
+gets one line back, `{"id": 1, "result": {...}}` or `{"id": 1, "error":
+"..."}`, not necessarily in order. Methods:
+- `solve(puzzle)`: `{"solution": "..."}`, null if there is none;
+- `count_solutions(puzzle, limit=2)`: `{"count": n}`, at most `limit`,
+  which can not be over `MAX_COUNT_LIMIT`;
+- `generate(level="easy", seed=None)`: `{"puzzle", "solution", "seed"}`,
+  `level` is a name of `sudoku.backend.Levels` or a number of given cells;
+- `hint(puzzle, row, column)`: `{"value": n}` of the solution;
+- `stats()`: throughput, latency and cache counters.
+Puzzles are 81 digits row by row, `0` or `.` for empty cells. Solving
+and counting give up with an error after `MAX_NODES` steps of search.
+
+Run `python -m sudoku.service` to serve, or with `--bench` to measure
+the service under concurrent load.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sudoku.backend import Levels, Sudoku
+from sudoku.parallel import CHECK_INTERVAL, Board, search
+
+# Requests that come within this many seconds of the first one waiting
+# are sent to the pool together, up to `BATCH_SIZE`.
+BATCH_WINDOW = 0.002
+BATCH_SIZE = 64
+CACHE_SIZE = 4096
+LATENCY_HISTORY = 10000
+# Counting takes longer with every solution, keep a request bounded
+MAX_COUNT_LIMIT = 100
+# Cells a solve or count may fill in, about half a second: the hardest
+# known puzzles take a few thousand, so only boards made to stall the
+# search reach it.
+MAX_NODES = 100000
+MISSING = object()
+
+# Jobs are tuples starting with one of these, the rest are arguments.
+SOLVE = 'solve'
+COUNT = 'count'
+GENERATE = 'generate'
+
+
+def find_solutions(puzzle: str, limit: int) -> List[str]:
+    """Up to `limit` solutions of a normalized puzzle."""
+    solutions = []
+    checks = 0
+
+    def on_solution(cells: List[int]) -> bool:
+        solutions.append(''.join(map(str, cells)))
+        return len(solutions) >= limit
+
+    def check(board: Board, stack: list) -> bool:
+        nonlocal checks
+        checks += 1
+        if checks * CHECK_INTERVAL >= MAX_NODES:
+            raise ValueError(f'No answer in {MAX_NODES} search steps')
+        return False
+
+    search(Board([int(char) for char in puzzle]), on_solution, check)
+    return solutions
+
+
+def run_job(job: tuple):
+    kind, *args = job
+    if kind == GENERATE:
+        clues, seed = args
+        sudoku = Sudoku()
+        sudoku.random.seed(seed)
+        sudoku.populate(clues)
+        return sudoku.to_string(), sudoku.virtual_sudoku.to_string()
+    if kind == COUNT:
+        return len(find_solutions(*args))
+    solutions = find_solutions(args[0], 1)
+    return solutions[0] if solutions else None
+
+
+def run_batch(jobs: List[tuple]) -> list:
+    """Run jobs in a pool worker: one round trip for all of them."""
+    results = []
+    for job in jobs:
+        try:
+            results.append((True, run_job(job)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def is_integer(value) -> bool:
+    # JSON true and false are decoded as bools, which are ints as well
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def normalize_puzzle(puzzle) -> str:
+    """Puzzle in the form used for cache keys, checked for conflicts."""
+    if not isinstance(puzzle, str):
+        raise ValueError('Puzzle must be a string')
+    return Sudoku.from_string(puzzle).to_string()
+
+
+class LRUCache:
+    def __init__(self, size: int):
+        self.size = size
+        self.items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        if key not in self.items:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key: Hashable, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+
+class SudokuService:
+    """
+    Answers requests from cached results, or from jobs run in `pool`.
+
+    Jobs are queued and sent in batches, split evenly between `workers`,
+    so that under load a pool round trip serves many requests. Identical
+    jobs waiting at the same time are run once.
+    """
+
+    def __init__(
+        self, pool: Executor, workers: int, cache_size: int = CACHE_SIZE,
+        batch_size: int = BATCH_SIZE, batch_window: float = BATCH_WINDOW
+    ):
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.cache = LRUCache(cache_size)
+        self.queue: Optional[asyncio.Queue] = None
+        self.running: Dict[tuple, asyncio.Future] = {}
+        self.batcher: Optional[asyncio.Task] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cache.hits = self.cache.misses = 0
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.jobs = 0
+        self.latencies: deque = deque(maxlen=LATENCY_HISTORY)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self.send_batches())
+
+    async def stop(self):
+        self.batcher.cancel()
+
+    async def run(self, job: tuple):
+        result = self.cache.get(job, MISSING)
+        if result is not MISSING:
+            return result
+        future = self.running.get(job)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.running[job] = future
+            self.queue.put_nowait(job)
+        return await asyncio.shield(future)
+
+    async def send_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.jobs += len(batch)
+            # Counting and generating take far longer than solving, so each
+            # of them goes to the pool alone and holds up no other job.
+            solves = [job for job in batch if job[0] == SOLVE]
+            for job in batch:
+                if job[0] != SOLVE:
+                    asyncio.ensure_future(self.run_chunk(loop, [job]))
+            if not solves:
+                continue
+            chunk_size = math.ceil(len(solves) / self.workers)
+            for start in range(0, len(solves), chunk_size):
+                chunk = solves[start:start + chunk_size]
+                asyncio.ensure_future(self.run_chunk(loop, chunk))
+
+    async def run_chunk(self, loop: asyncio.AbstractEventLoop, jobs: list):
+        try:
+            results = await loop.run_in_executor(self.pool, run_batch, jobs)
+        except Exception as e:
+            results = [(False, e)] * len(jobs)
+        for job, (ok, result) in zip(jobs, results):
+            future = self.running.pop(job)
+            if ok:
+                self.cache.put(job, result)
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    async def solve(self, puzzle) -> dict:
+        return {'solution': await self.run((SOLVE, normalize_puzzle(puzzle)))}
+
+    async def count_solutions(self, puzzle, limit: int = 2) -> dict:
+        if not is_integer(limit) or not 1 <= limit <= MAX_COUNT_LIMIT:
+            raise ValueError(
+                f'Limit must be an integer from 1 to {MAX_COUNT_LIMIT}'
+            )
+        count = await self.run((COUNT, normalize_puzzle(puzzle), limit))
+        return {'count': count}
+
+    async def generate(self, level='easy', seed: Optional[int] = None):
+        if isinstance(level, str):
+            if level not in Levels.__members__:
+                raise ValueError(f'Unknown level: {level}')
+            level = Levels[level].value
+        # Fewer given cells than the hardest level would take too long
+        if not is_integer(level) or not min(Levels) <= level <= 81:
+            raise ValueError(
+                f'Level must be a name or from {min(Levels).value} to 81 '
+                f'cells'
+            )
+        if seed is not None and not is_integer(seed):
+            raise ValueError('Seed must be an integer')
+        if seed is None:
+            # Returned, so that the board can be asked for again
+            seed = random.randrange(2 ** 32)
+        puzzle, solution = await self.run((GENERATE, level, seed))
+        # Hints for a new board should not need a solver
+        self.cache.put((SOLVE, puzzle), solution)
+        return {'puzzle': puzzle, 'solution': solution, 'seed': seed}
+
+    async def hint(self, puzzle, row: int, column: int) -> dict:
+        if not (
+            is_integer(row) and is_integer(column)
+            and 0 <= row < 9 and 0 <= column < 9
+        ):
+            raise ValueError('Row and column must be from 0 to 8')
+        solution = (await self.solve(puzzle))['solution']
+        if solution is None:
+            raise ValueError('Puzzle has no solution')
+        return {'value': int(solution[row * 9 + column])}
+
+    async def stats(self) -> dict:
+        if len(self.latencies) > 1:
+            percentiles = statistics.quantiles(self.latencies, n=100)
+        else:
+            percentiles = [0.0] * 99
+        seconds = time.monotonic() - self.started
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'requests_per_second': self.requests / seconds,
+            'p50_ms': percentiles[49] * 1000,
+            'p99_ms': percentiles[98] * 1000,
+            'batches': self.batches,
+            'mean_batch': self.jobs / max(self.batches, 1),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+        }
+
+    METHODS = {'solve', 'count_solutions', 'generate', 'hint', 'stats'}
+
+    async def handle(self, request: dict) -> dict:
+        started = time.perf_counter()
+        response = {'id': request.get('id')}
+        try:
+            method = request.get('method')
+            if method not in self.METHODS:
+                raise ValueError(f'Unknown method: {method}')
+            params = {
+                key: value for key, value in request.items()
+                if key not in ('id', 'method')
+            }
+            response['result'] = await getattr(self, method)(**params)
+        except Exception as e:
+            self.errors += 1
+            response['error'] = str(e)
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - started)
+        return response
+
+    async def serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                self.errors += 1
+                response = {'id': None, 'error': 'Not a JSON object'}
+            else:
+                response = await self.handle(request)
+            writer.write(json.dumps(response).encode() + b'\n')
+
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await writer.drain()
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service: SudokuService, host: str, port: int):
+    service.start()
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print(f'Serving sudoku on {host}:{port}', file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+async def benchmark(
+    service: SudokuService, requests: int, concurrency: int, boards: int
+) -> Tuple[dict, float]:
+    """
+    Load the service from `concurrency` clients at once: they generate
+    `boards` boards, then ask for hints, solutions and counts on them.
+    """
+    service.start()
+    rng = random.Random(0)
+    puzzles = [
+        response['result']['puzzle']
+        for response in await asyncio.gather(*(
+            service.handle({'method': 'generate', 'seed': seed})
+            for seed in range(boards)
+        ))
+    ]
+    # Stats are about the load, not the warm up
+    service.reset_stats()
+    started = time.perf_counter()
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            puzzle = rng.choice(puzzles)
+            kind = rng.random()
+            if kind < 0.6:
+                request = {
+                    'method': 'hint', 'puzzle': puzzle,
+                    'row': rng.randrange(9), 'column': rng.randrange(9)
+                }
+            elif kind < 0.8:
+                request = {'method': 'solve', 'puzzle': puzzle}
+            elif kind < 0.95:
+                request = {'method': 'count_solutions', 'puzzle': puzzle}
+            else:
+                request = {'method': 'generate', 'seed': rng.randrange(100)}
+            await service.handle(request)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    await service.stop()
+    return await service.stats(), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2324)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    parser.add_argument(
+        '--bench', type=int, metavar='REQUESTS',
+        help='measure throughput and latency for this many requests'
+    )
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--boards', type=int, default=20)
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        service = SudokuService(pool, args.workers, args.cache_size)
+        if args.bench:
+            stats, seconds = asyncio.run(benchmark(
+                service, args.bench, args.concurrency, args.boards
+            ))
+            print(
+                f'{args.bench} requests from {args.concurrency} clients '
+                f'in {seconds:.2f} s: '
+                f'{args.bench / seconds:.0f} requests/s, '
+                f'p50 {stats["p50_ms"]:.2f} ms, '
+                f'p99 {stats["p99_ms"]:.2f} ms, '
+                f'{stats["batches"]} batches of '
+                f'{stats["mean_batch"]:.1f} jobs, '
+                f'cache {stats["cache_hits"]} hits, '
+                f'{stats["cache_misses"]} misses'
+            )
+            return
+        try:
+            asyncio.run(serve(service, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
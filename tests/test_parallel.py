@@ -0,0 +1,35 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from sudoku.parallel import HARD_PUZZLE, from_string, solve_parallel
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_cancel_with_queued_subproblems_exits():
+    # Subproblems of 25 x 25 boards for 16 workers do not fit in the pipe
+    # of the task queue. Cancelling after the first solution used to leave
+    # the interpreter waiting for them forever on exit.
+    code = (
+        'from sudoku.parallel import solve_parallel\n'
+        'result = solve_parallel([0] * 625, 5, 1, 16)\n'
+        'assert len(result.solutions) == 1\n'
+    )
+    subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, timeout=60, check=True
+    )
+
+
+def test_workers_find_the_same_solutions():
+    cells, box = from_string(HARD_PUZZLE)
+    cells[:3] = [0, 0, 0]
+    alone = solve_parallel(cells, box, 10 ** 6, workers=1)
+    shared = solve_parallel(cells, box, 10 ** 6, workers=4)
+    assert sorted(alone.solutions) == sorted(shared.solutions)
+    assert len(alone.solutions) > 1
+
+
+def test_unique_puzzle():
+    cells, box = from_string(HARD_PUZZLE)
+    assert len(solve_parallel(cells, box, 2, workers=4).solutions) == 1
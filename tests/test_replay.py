@@ -0,0 +1,49 @@
+import pytest
+
+from replay import GameKind, Replay
+
+
+def make_replay() -> Replay:
+    replay = Replay(GameKind.snake, 2 ** 40 + 3, (0, 0, 24, 60, 2))
+    for tick, code in [(0, 1), (5, 2), (5, 3), (200, 0), (70000, 1)]:
+        replay.record(tick, code)
+    replay.ticks = 80000
+    return replay
+
+
+def test_round_trip():
+    replay = make_replay()
+    loaded = Replay.load(replay.dump())
+    assert loaded.kind == replay.kind
+    assert loaded.seed == replay.seed
+    assert loaded.params == replay.params
+    assert loaded.events == replay.events
+    assert loaded.ticks == replay.ticks
+
+
+def test_ticks_are_delta_encoded():
+    early = Replay(GameKind.sudoku, 0, (0, 0, 0))
+    late = Replay(GameKind.sudoku, 0, (0, 0, 0))
+    for tick in range(100):
+        early.record(tick, 1)
+        late.record(10 ** 9 + tick, 1)
+    # Only the first delta and the length grow
+    assert len(late.dump()) - len(early.dump()) <= 8
+    assert Replay.load(late.dump()).events == late.events
+
+
+def test_truncated_replay_is_rejected():
+    data = make_replay().dump()
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            Replay.load(data[:length])
+
+
+@pytest.mark.parametrize('kind, params', [
+    (GameKind.snake, (0, 0, 24, 60)),
+    (GameKind.sudoku, (36, 1)),
+    (GameKind.sudoku, (36, 1, 0, 0)),
+])
+def test_wrong_params_are_rejected(kind, params):
+    with pytest.raises(ValueError):
+        Replay.load(Replay(kind, 0, params).dump())
@@ -0,0 +1,49 @@
+import asyncio
+import os
+
+from server import GameServer, create_pool
+
+
+def offload_or_quit(screen):
+    # 'o' runs a job in the pool and waits for the next key, anything else
+    # ends the session.
+    while screen.getch() == ord('o'):
+        screen.addstr(0, 0, f'pid {screen.offload(os.getpid)}')
+        screen.refresh()
+
+
+async def read_until(reader: asyncio.StreamReader, text: bytes):
+    data = b''
+    while text not in data:
+        chunk = await reader.read(4096)
+        assert chunk, 'Closed before the output came'
+        data += chunk
+
+
+async def close_after_pool_start():
+    with create_pool(1) as pool:
+        game_server = GameServer(offload_or_quit, pool=pool)
+        server = await asyncio.start_server(
+            game_server.serve_client, '127.0.0.1', 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            waiting_reader, waiting_writer = await asyncio.open_connection(
+                '127.0.0.1', port
+            )
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            # The pool starts its worker while the other client is connected
+            writer.write(b'o')
+            await asyncio.wait_for(read_until(reader, b'pid'), 30)
+
+            waiting_writer.write(b'q')
+            await asyncio.wait_for(waiting_reader.read(), 5)
+            assert waiting_reader.at_eof()
+            writer.write(b'q')
+            await asyncio.wait_for(reader.read(), 5)
+            waiting_writer.close()
+            writer.close()
+
+
+def test_session_ends_after_pool_starts():
+    asyncio.run(close_after_pool_start())
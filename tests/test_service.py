@@ -0,0 +1,19 @@
+from sudoku import service
+from sudoku.parallel import HARD_PUZZLE
+
+# Consistent, but 9 has no place in the first row. The column first
+# search of `Sudoku.solve` takes minutes to find that out.
+STALLING_PUZZLE = '12345678' + '0' * 45 + '9' + '0' * 27
+
+
+def test_stalling_puzzle_has_no_solution():
+    assert service.run_batch([
+        (service.SOLVE, STALLING_PUZZLE),
+        (service.COUNT, STALLING_PUZZLE, 2),
+    ]) == [(True, None), (True, 0)]
+
+
+def test_search_gives_up(monkeypatch):
+    monkeypatch.setattr(service, 'MAX_NODES', 1000)
+    [(ok, error)] = service.run_batch([(service.COUNT, HARD_PUZZLE, 2)])
+    assert not ok and isinstance(error, ValueError)
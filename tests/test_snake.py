@@ -0,0 +1,16 @@
+import pytest
+
+from snake.backend import Direction, SnakeGame
+
+
+def test_board_without_apples_is_won():
+    game = SnakeGame(0, 0, 6, 6, seed=0)
+    assert game.done and game.won
+    assert game.step(Direction.right).done
+    assert game.ticks == 0
+
+
+def test_batch_agrees_on_board_without_apples():
+    batch = pytest.importorskip('snake.batch')
+    game = batch.BatchSnakeGame(2, 6, 6, seed=0)
+    assert game.dones.all() and game.wins.all()